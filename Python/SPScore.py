@@ -1,60 +1,40 @@
 from Bio import AlignIO
+from tracing import tracing
+from statistics import NormalDist
+import numpy as np
+import compiled_matrix
+import compression
+import fasta_stream
+import sp_kernel
+import time
 
 class SPScore:
-    def __init__(self, matrix_file):
+    def __init__(self, matrix_file, tracer=None, use_kernel=None):
         """
         Initializes the scoring_matrix object and loads the scoring matrix.
         
         Parameters:
-            matrix_file: Path to the scoring matrix file in BLAST format.
+            matrix_file: Path to the scoring matrix file in BLAST format (compiled and cached on first use).
+            tracer: Tracer used to time the parsing and scoring stages (default: disabled tracer).
+            use_kernel: Whether the compiled kernel should be used (default: only if Numba is installed).
         """
-        self.scoring_matrix = self.load_matrix(matrix_file)
+        self.dense_matrix = compiled_matrix.load_compiled(matrix_file)
+        self.scoring_matrix = self.matrix_dict(self.dense_matrix)
+        self.tracer = tracer if tracer is not None else tracing()
+        self.use_kernel = sp_kernel.available if use_kernel is None else use_kernel
 
-    def read_scoring_matrix(self, file, parse_matrix=lambda x: x):
+    def matrix_dict(self, table):
         """
-        Reads a BLAST format matrix and yields key-value pairs for the matrix.
+        Converts a dense scoring table into the dictionary used by pairwise_score, so both implementations share the same scores.
         
         Parameters:
-            file: Input file object containing the BLAST format matrix.
-            parse_matrix: Function to transform the matrix values. Default returns values unchanged.
-        
-        Yields:
-            ((row_id, col_id), parse_matrix(matrix_cell)): Tuple matrix containing each possible pair of nucleotides/proteins and their respective scores.
-        """
-        try:
-            # Reading and splitting all the lines/rows of the matrix
-            rows = (line.rstrip().split() for line in file)
-            
-            # Extracting the headers/column identifiers of the matrix
-            header = next(rows)
-            
-            # Processing rows
-            # Ensuring that every character is in upper case
-            for row in rows:
-                row_id = row[0].upper()
-                
-                # Iterating through matrix cells, pairing each column identifier with its corresponding matrix value
-                for col_id, matrix_cell in zip(header, row[1:]):
-                    yield ((row_id, col_id), parse_matrix(matrix_cell))
-        except:
-            raise Exception
-
-    def load_matrix(self, matrix_file):
-        """
-        Opens the matrix file and processes it into a dictionary object.
-        
-        Parameters:
-            matrix_file: Path to the scoring matrix file.
+            table: 256x256 table indexed by the byte code of each character.
         
         Returns:
-            {key: int(value) for key, value in matrix.items()}: Dictionary representing the scoring matrix.
+            scoring_matrix: Dictionary with every pair of characters whose score is not the unknown score.
         """
-        # Open matrix file
-        with open(matrix_file) as f:
-            # Parse the file and convert it into a dictionary
-            matrix = dict(self.read_scoring_matrix(f))
-            # Convert all values to integers
-            return {key: int(value) for key, value in matrix.items()}
+        rows, cols = np.nonzero(np.asarray(table) != compiled_matrix.UNKNOWN_SCORE)
+        return {(chr(a), chr(b)): int(table[a, b]) for a, b in zip(rows, cols)}
 
     def affine_gap_penalty(self, gap_len, gapO=-6, gap_ext=-1):
         """
@@ -70,6 +50,17 @@ class SPScore:
         """
         return gapO + gap_len * gap_ext
 
+    def gap_parameters(self):
+        """
+        Derives the gap opening and extension penalties used by the compiled kernel from affine_gap_penalty, so both implementations always agree.
+        
+        Returns:
+            gap_open: Penalty of a gap of length zero.
+            gap_ext: Penalty added by each gap position.
+        """
+        gap_open = self.affine_gap_penalty(0)
+        return gap_open, self.affine_gap_penalty(1) - gap_open
+
     def pairwise_score(self, seq1, seq2):
         """
         Calculates the pairwise score of two aligned sequences using the scoring matrix and gap penalties.
@@ -109,10 +100,291 @@ class SPScore:
                 if gap2 > 0:
                     score += self.affine_gap_penalty(gap2)
                     gap2 = 0
-                score += self.scoring_matrix.get((a, b), 0)
+                score += self.scoring_matrix.get((a, b), compiled_matrix.UNKNOWN_SCORE)
 
         return score
 
+    def read_records(self, aligned_file):
+        """
+        Summary:
+            Parses an aligned FASTA file into the identifiers and the upper case aligned sequences (traced as the "parse" stage).
+
+        Parameters:
+            aligned_file: FASTA file containing the aligned sequences (plain or compressed with gzip, bgzip, bz2 or xz),
+                          or a streamed_alignment read from the output pipe of an MSA software.
+
+        Returns:
+            names: List containing the identifier of every aligned sequence.
+            rows: List containing every aligned sequence as an upper case string (a matrix of byte codes for a streamed_alignment).
+        """
+        with self.tracer.span("parse"):
+            # Alignments streamed from an MSA software are parsed from the output kept in memory
+            if isinstance(aligned_file, fasta_stream.streamed_alignment):
+                return aligned_file.parse()
+
+            # Parsing the aligned FASTA file into an AlignIO object, decompressing it on the fly if it is compressed
+            with compression.open_input(aligned_file, "rt") as handle:
+                alignment = AlignIO.read(handle, "fasta")
+
+        # We are just ensuring that every character of the sequences are upper case
+        return [record.id for record in alignment], [str(record.seq).upper() for record in alignment]
+
+    def read_alignment(self, aligned_file):
+        """
+        Summary:
+            Parses an aligned FASTA file into a list of upper case aligned sequences.
+
+        Parameters:
+            aligned_file: FASTA file containing the aligned sequences, or a streamed_alignment.
+
+        Returns:
+            rows: List containing every aligned sequence as an upper case string (a matrix of byte codes for a streamed_alignment).
+        """
+        return self.read_records(aligned_file)[1]
+
+    def row_keys(self, rows):
+        """
+        Summary:
+            Gets a hashable key for every aligned sequence (the string itself, or the bytes of a row of byte codes).
+
+        Parameters:
+            rows: List containing every aligned sequence as an upper case string, or matrix of byte codes.
+
+        Returns:
+            keys: Iterator over the key of every sequence.
+        """
+        if isinstance(rows, np.ndarray):
+            return (row.tobytes() for row in rows)
+        return iter(rows)
+
+    def collapse_rows(self, rows):
+        """
+        Summary:
+            Groups identical aligned sequences (ex.: identical isolates or strains) so every distinct sequence is scored only once.
+
+        Parameters:
+            rows: List containing every aligned sequence as an upper case string, or matrix of byte codes.
+
+        Returns:
+            unique: Every distinct aligned sequence, in order of first appearance (list of strings, or matrix of byte codes).
+            counts: List containing the number of copies of each distinct sequence.
+        """
+        # Rows are hashed by the dictionary, which keeps the order of first appearance
+        counts = {}
+        first = {}
+        for i, key in enumerate(self.row_keys(rows)):
+            counts[key] = counts.get(key, 0) + 1
+            first.setdefault(key, i)
+
+        if isinstance(rows, np.ndarray):
+            return rows[list(first.values())], list(counts.values())
+        return list(counts.keys()), list(counts.values())
+
+    def score_rows(self, rows):
+        """
+        Summary:
+            Calculates the SP-Score of a list of aligned sequences, using the compiled kernel when it is available.
+            Identical sequences are collapsed first, so only U*(U-1)/2 pairs are scored (U being the number of distinct sequences),
+            and each score is weighted by the number of copies of both sequences. The result is exactly the same as scoring every pair.
+
+        Parameters:
+            rows: List containing every aligned sequence as an upper case string, or matrix of byte codes.
+
+        Returns:
+            sp_score: Sum of the pairwise scores of every pair of sequences.
+        """
+        unique, counts = self.collapse_rows(rows)
+
+        if self.use_kernel:
+            gap_open, gap_ext = self.gap_parameters()
+            return int(sp_kernel.sp_score(sp_kernel.encode_rows(unique), np.array(counts, dtype=np.int64), self.dense_matrix, gap_open, gap_ext))
+
+        unique = sp_kernel.decode_rows(unique)
+        num_seqs = len(unique)
+        sp_score = 0
+
+        for i in range(num_seqs):
+            # Pairs made of two copies of the same sequence
+            if counts[i] > 1:
+                sp_score += counts[i] * (counts[i] - 1) // 2 * self.pairwise_score(unique[i], unique[i])
+            # Every copy of sequence i is paired with every copy of sequence j
+            for j in range(i + 1, num_seqs):
+                sp_score += counts[i] * counts[j] * self.pairwise_score(unique[i], unique[j])
+
+        return sp_score
+
+    def reference_score_rows(self, rows):
+        """
+        Summary:
+            Calculates the SP-Score of a list of aligned sequences with the pure Python pairwise_score (reference implementation).
+
+        Parameters:
+            rows: List containing every aligned sequence as an upper case string.
+
+        Returns:
+            sp_score: Sum of the pairwise scores of every pair of sequences.
+        """
+        # Determine the number of sequences on the alignment and creating an object to handle the SP-Score value
+        num_seqs = len(rows)
+        sp_score = 0
+
+        # Calculates the pairwise score for every pair of sequences of the alignment
+        for i in range(num_seqs):
+            for j in range(i + 1, num_seqs):
+                # Add all the obtained pairwise score values to the sp_score object
+                sp_score += self.pairwise_score(rows[i], rows[j])
+
+        return sp_score
+
+    def pair_scores(self, unique, encoded, left, right):
+        """
+        Summary:
+            Calculates the pairwise score of a batch of pairs of distinct sequences.
+
+        Parameters:
+            unique: List containing every distinct aligned sequence as a string (only used by the pure Python implementation).
+            encoded: Byte code matrix of the distinct sequences (only used by the compiled kernel).
+            left: Array with the index of the first sequence of every pair.
+            right: Array with the index of the second sequence of every pair.
+
+        Returns:
+            scores: Array with the score of every pair.
+        """
+        if self.use_kernel:
+            gap_open, gap_ext = self.gap_parameters()
+            return sp_kernel.pair_scores(encoded, left, right, self.dense_matrix, gap_open, gap_ext)
+        return np.array([self.pairwise_score(unique[i], unique[j]) for i, j in zip(left, right)], dtype=np.int64)
+
+    def estimate_rows(self, rows, rel_error=0.01, time_budget=None, confidence=0.95, stratified=False, batch_size=2000, seed=None):
+        """
+        Summary:
+            Estimates the SP-Score of a list of aligned sequences by scoring a random sample of pairs and scaling it to the total number of pairs.
+            Pairs are sampled in batches until the confidence interval is narrower than the requested relative error or the time budget runs out.
+            If the next batch would reach the total number of pairs, the exact SP-Score is calculated instead (with a half-width of zero).
+            With stratification, sequences are split into groups of similar ungapped length and every pair of groups is sampled separately,
+            giving more samples to the pairs of groups whose scores vary the most.
+
+        Parameters:
+            rows: List containing every aligned sequence as an upper case string, or matrix of byte codes.
+            rel_error: Relative half-width of the confidence interval at which the sampling stops (default: 0.01).
+            time_budget: Maximum time (in seconds) spent sampling. None means no limit (default: None).
+            confidence: Confidence level of the interval (default: 0.95).
+            stratified: Whether the pairs should be sampled by strata of sequence length (default: False).
+            batch_size: Number of pairs scored between two checks of the stopping criteria (default: 2000).
+            seed: Seed of the random number generator (default: None).
+
+        Returns:
+            estimate: Estimated SP-Score of the alignment.
+            half_width: Half-width of the confidence interval (the SP-Score is within estimate ± half_width).
+            sampled: Number of pairs that were scored.
+        """
+        start_time = time.perf_counter()
+        num_seqs = len(rows)
+        total_pairs = num_seqs * (num_seqs - 1) // 2
+
+        # Small alignments are scored exactly, sampling would not be any faster
+        if total_pairs <= batch_size:
+            return self.score_rows(rows), 0.0, total_pairs
+
+        rng = np.random.default_rng(seed)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        # Map every sequence to its distinct sequence, so duplicates are only encoded once
+        unique, _ = self.collapse_rows(rows)
+        index = {key: k for k, key in enumerate(self.row_keys(unique))}
+        row_ids = np.array([index[key] for key in self.row_keys(rows)], dtype=np.int64)
+        encoded = sp_kernel.encode_rows(unique) if self.use_kernel else None
+        unique = unique if self.use_kernel else sp_kernel.decode_rows(unique)
+
+        # Split the sequences into groups of similar ungapped length (a single group without stratification)
+        num_groups = min(8, num_seqs // 2) if stratified else 1
+        if isinstance(rows, np.ndarray):
+            lengths = (rows != sp_kernel.GAP).sum(axis=1)
+        else:
+            lengths = np.array([len(row) - row.count("-") for row in rows])
+        groups = np.array_split(np.argsort(lengths, kind="stable"), num_groups)
+
+        # Every pair of groups is a stratum with a known number of pairs
+        strata = []
+        for g in range(num_groups):
+            for h in range(g, num_groups):
+                if g == h:
+                    size = len(groups[g]) * (len(groups[g]) - 1) // 2
+                else:
+                    size = len(groups[g]) * len(groups[h])
+                if size > 0:
+                    strata.append((groups[g], groups[h], size))
+        sizes = np.array([stratum[2] for stratum in strata], dtype=np.float64)
+
+        # Running sums used to calculate the mean and variance of every stratum
+        counts = np.zeros(len(strata))
+        sums = np.zeros(len(strata))
+        squares = np.zeros(len(strata))
+
+        while True:
+            # The first batch is split proportionally to the stratum sizes, the next ones also to their standard deviations (Neyman allocation)
+            if counts.min() < 2:
+                weights = sizes
+            else:
+                weights = sizes * (np.sqrt(np.maximum(squares / counts - (sums / counts) ** 2, 0)) + 1e-9)
+            allocation = np.maximum(np.round(batch_size * weights / weights.sum()).astype(np.int64), 2)
+
+            # Sampling as many pairs as there are (ex.: SP-Scores close to zero never reach the relative error) is slower than scoring them all
+            if counts.sum() + allocation.sum() >= total_pairs:
+                return self.score_rows(rows), 0.0, total_pairs
+
+            for k, (group_a, group_b, _) in enumerate(strata):
+                n = allocation[k]
+                first = rng.integers(len(group_a), size=n)
+                if group_a is group_b:
+                    # A non-zero offset picks a second, different sequence of the same group
+                    second = (first + rng.integers(1, len(group_a), size=n)) % len(group_a)
+                    left, right = group_a[first], group_a[second]
+                else:
+                    left, right = group_a[first], group_b[rng.integers(len(group_b), size=n)]
+
+                scores = self.pair_scores(unique, encoded, row_ids[left], row_ids[right]).astype(np.float64)
+                counts[k] += n
+                sums[k] += scores.sum()
+                squares[k] += (scores ** 2).sum()
+
+            # Scale the mean of every stratum to its number of pairs
+            means = sums / counts
+            variances = np.maximum(squares / counts - means ** 2, 0) * counts / np.maximum(counts - 1, 1)
+            estimate = float((sizes * means).sum())
+            half_width = float(z * np.sqrt((sizes ** 2 * variances / counts).sum()))
+            sampled = int(counts.sum())
+
+            # Stop when the interval is narrow enough or the time is over
+            if half_width <= rel_error * abs(estimate):
+                break
+            if time_budget is not None and time.perf_counter() - start_time >= time_budget:
+                break
+
+        return estimate, half_width, sampled
+
+    def score_or_estimate(self, rows, estimate_settings=None):
+        """
+        Summary:
+            Calculates the exact SP-Score of a list of aligned sequences, or estimates it from a random sample of pairs (see estimate_rows).
+
+        Parameters:
+            rows: List containing every aligned sequence as an upper case string, or matrix of byte codes.
+            estimate_settings: Sampling settings passed to estimate_rows (rel_error, time_budget, confidence, stratified, seed),
+                               None to calculate the exact SP-Score (default: None).
+
+        Returns:
+            sp_score: SP-Score (exact or estimated) of the aligned sequences.
+            half_width: Half-width of the confidence interval of an estimated SP-Score, None for an exact SP-Score.
+        """
+        if estimate_settings is None:
+            with self.tracer.span("sp_score"):
+                return self.score_rows(rows), None
+
+        with self.tracer.span("sp_estimate"):
+            estimate, half_width, _ = self.estimate_rows(rows, **estimate_settings)
+        return estimate, half_width
+
     def sp_score(self, aligned_file):
         """
         Summary:
@@ -120,7 +392,7 @@ class SPScore:
             scoring matrix and the defined gap penalties.
         
         Parameters:
-            aligned_file: FASTA file containing the aligned sequences.
+            aligned_file: FASTA file containing the aligned sequences (or a streamed_alignment).
         
         Returns:
             sp_score: SP-Score calculated for the input aligned file.
@@ -130,22 +402,7 @@ class SPScore:
             return "N/A"
         else:
             try:
-                # Parsing the aligned FASTA file into an AlignIO object
-                alignment = AlignIO.read(aligned_file, "fasta")
-                
-                # Determine the number of sequences on the aligned file and creating an object to handle the SP-Score value
-                num_seqs = len(alignment)
-                sp_score = 0
-
-                # Calculates the pairwise score for every pair of sequences of the file
-                for i in range(num_seqs):
-                    for j in range(i + 1, num_seqs):
-                        # We are just ensuring that every character of the sequences are upper case
-                        seq1 = str(alignment[i].seq).upper()
-                        seq2 = str(alignment[j].seq).upper()
-                        # Add all the obtained pairwise score values to the sp_score object
-                        sp_score += self.pairwise_score(seq1, seq2)
-
-                return sp_score
+                rows = self.read_alignment(aligned_file)
+                return self.score_or_estimate(rows)[0]
             except:
-                raise Exception
\ No newline at end of file
+                raise Exception
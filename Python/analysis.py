@@ -7,11 +7,12 @@ class analysis:
     def __init__(self):
         pass
     
-    def normalized_score(self, value, info_dict, choice=None):
+    def normalized_score(self, value, info_dict, choice=None, scale=5):
         """
         Summary:
             Normalizes a given value based on a dictionary of values.
             - For SP-Score (higher is better), we scale to [0,5].
+            - For TC Score and SP Agreement (higher is better), we scale to [0,1].
             - For RAM, Time, and CPU (lower is better), we scale to [0,1].
 
         Parameters:
@@ -19,6 +20,7 @@ class analysis:
             info_dict: Dictionary containing all values for this specific parameter.
             choice: If None, SP-Score normalization is used (higher is better).
                     Otherwise, inverse normalization is applied (lower is better).
+            scale: Maximum normalized value when higher is better (default: 5).
 
         Returns:
             normalized_score: The normalized value.
@@ -37,14 +39,14 @@ class analysis:
         # Otherwise, it will procide with the normal calculus
         else:
             if choice is None:
-                # Normalize SP-Score (higher is better) → range [0,5]
+                # Normalize SP-Score (higher is better) → range [0,scale]
                 min_spscore = min(scores)
                 max_spscore = max(scores)
                 if max_spscore != min_spscore:  
-                    normalized_score = 5 * (value - min_spscore) / (max_spscore - min_spscore)
+                    normalized_score = scale * (value - min_spscore) / (max_spscore - min_spscore)
                 else:
                     # If all SP-Scores are the same
-                    normalized_score = 5
+                    normalized_score = scale
             
             else:
                 # Normalize RAM, Time, and CPU (lower is better) → range [0,1]
@@ -59,7 +61,7 @@ class analysis:
             
         return normalized_score
 
-    def create_bar_plot(self, info_dict, ylabel, title):
+    def create_bar_plot(self, info_dict, ylabel, title, errors=None):
         """
         Summary: 
             Creates a bar plot with the values displayed on top of each bar.
@@ -68,6 +70,7 @@ class analysis:
             info_dict: Dictionary with software names as keys and parameter values as values.
             ylabel: Label for the y-axis of the bar plot.
             title: Title of the bar plot.
+            errors: Dictionary with the uncertainty (± value) of every software, drawn as error bars (default: None).
 
         Returns:
             plot_file_path: The absolute path to the saved bar plot image file.
@@ -99,9 +102,14 @@ class analysis:
         labels = list(cleaned_dict.keys())
         values = list(cleaned_dict.values())
         
+        # Uncertainty of every bar, if there is any
+        yerr = None
+        if errors:
+            yerr = [errors.get(k) or 0 for k in labels]
+        
         # Create the bar plot
         fig, ax = plt.subplots()
-        bars = ax.bar(labels, values, color="blue", width=0.5)
+        bars = ax.bar(labels, values, color="blue", width=0.5, yerr=yerr, capsize=4)
         
         # Add labels and a title
         ax.set_xlabel("MSA Softwares")
@@ -132,7 +140,7 @@ class analysis:
         
         return plot_file_path  
         
-    def create_table(self, sp_scores, memories, times, cpus, o_scores, info_dict):
+    def create_table(self, sp_scores, memories, times, cpus, o_scores, info_dict, sp_errors=None, quality_scores=None):
         """
         Summary: 
             Creates a table with every MSA software and their respective scores for every parameter.
@@ -143,6 +151,9 @@ class analysis:
             times: Dictionary containing the execution time of every MSA software.
             cpus: Dictionary containing the CPU usage of every MSA software.
             o_scores: Dictionary containing the overall scores of every MSA software.
+            info_dict: Dictionary whose keys are the MSA softwares.
+            sp_errors: Dictionary containing the uncertainty (± value) of every estimated SP-Score (default: None).
+            quality_scores: Dictionary with the name of every quality metric and a dictionary with its value for every MSA software (default: None).
 
         Returns:
             table: The table object without the indexes of each list parameter (MSA softwares)
@@ -167,6 +178,15 @@ class analysis:
         # Convert the data into a dataframe
         df = pd.DataFrame(data=d)
         
+        # Add the uncertainty of the SP-Scores right after them, if they were estimated
+        if sp_errors is not None:
+            df.insert(2, "SP-Score (±)", ["N/A" if i==None else i for i in sp_errors.values()])
+        
+        # Add the quality metrics before the resource usage
+        if quality_scores is not None:
+            for metric, values in quality_scores.items():
+                df.insert(df.columns.get_loc("RAM Usage (KB)"), metric, ["N/A" if i==None else i for i in values.values()])
+        
         # Create the table object removing the indexes
         table = df.to_string(index=False) + "\n"
         
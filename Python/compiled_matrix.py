@@ -0,0 +1,206 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+# Bump when the compiled format changes, so old cached files are ignored
+FORMAT_VERSION = 1
+
+# Score of any pair involving a symbol that is not in the matrix (same as the old dictionary lookup default)
+UNKNOWN_SCORE = 0
+
+# Ambiguity codes that take the scores of another symbol when the matrix file does not define them
+# (B: D/N, Z: E/Q, J: I/L, all scored as the unknown residue X). X and * are never aliased: if missing they score UNKNOWN_SCORE.
+ALIASES = {"B": "X", "Z": "X", "J": "X"}
+
+class MatrixParseError(ValueError):
+    """
+    Summary:
+        Raised when a scoring matrix file is not a valid BLAST format matrix. The message contains the file and line of the problem.
+    """
+    pass
+
+def read_scoring_matrix(file, path="<matrix>"):
+    """
+    Summary:
+        Reads a BLAST format matrix and yields key-value pairs for the matrix. Blank lines and '#' comments are skipped.
+
+    Parameters:
+        file: Input file object containing the BLAST format matrix.
+        path: Name of the file, used in the error messages.
+
+    Yields:
+        ((row_id, col_id), score): Pair of nucleotides/proteins and its integer score.
+
+    Raises:
+        MatrixParseError: If the header, a row symbol or a score is not valid.
+    """
+    header = None
+    seen_rows = set()
+
+    for line_number, line in enumerate(file, start=1):
+        cells = line.split()
+        if not cells or cells[0].startswith("#"):
+            continue
+
+        # The first line with content contains the column identifiers of the matrix
+        if header is None:
+            header = cells
+            for symbol in header:
+                if len(symbol) != 1:
+                    raise MatrixParseError(f"{path}, line {line_number}: column symbol '{symbol}' must be a single character")
+            if len(set(header)) != len(header):
+                raise MatrixParseError(f"{path}, line {line_number}: the header has repeated symbols")
+            continue
+
+        # Ensuring that every row identifier is in upper case
+        row_id = cells[0].upper()
+        if len(row_id) != 1:
+            raise MatrixParseError(f"{path}, line {line_number}: row symbol '{cells[0]}' must be a single character")
+        if row_id in seen_rows:
+            raise MatrixParseError(f"{path}, line {line_number}: row '{row_id}' is defined twice")
+        if len(cells) - 1 != len(header):
+            raise MatrixParseError(f"{path}, line {line_number}: row '{row_id}' has {len(cells) - 1} scores, expected {len(header)}")
+        seen_rows.add(row_id)
+
+        # Pairing each column identifier with its corresponding matrix value
+        for col_id, matrix_cell in zip(header, cells[1:]):
+            try:
+                score = int(matrix_cell)
+            except ValueError:
+                raise MatrixParseError(f"{path}, line {line_number}: score '{matrix_cell}' of pair ({row_id}, {col_id}) is not an integer") from None
+            yield ((row_id, col_id), score)
+
+    if header is None:
+        raise MatrixParseError(f"{path}: the file has no header")
+    if not seen_rows:
+        raise MatrixParseError(f"{path}: the file has no scores")
+
+def compile_matrix(pairs):
+    """
+    Summary:
+        Compiles the pairs of a scoring matrix into a dense lookup table indexed by the byte code of both characters.
+        Lowercase letters score like their upper case version, missing ambiguity codes follow ALIASES and every other byte scores UNKNOWN_SCORE.
+
+    Parameters:
+        pairs: Iterable of ((row_id, col_id), score), as yielded by read_scoring_matrix.
+
+    Returns:
+        table: 256x256 numpy array (int32).
+    """
+    # Scores of the symbols of the file, with an extra last row and column for the unknown symbols
+    base = np.full((257, 257), UNKNOWN_SCORE, dtype=np.int32)
+    defined = set()
+    for (a, b), score in pairs:
+        if ord(a) < 256 and ord(b) < 256:
+            base[ord(a), ord(b)] = score
+            defined.update((a, b))
+
+    # Explicit mapping of every byte code to the row/column of the base matrix it takes its scores from
+    source = np.full(256, 256, dtype=np.int64)
+    for symbol in defined:
+        source[ord(symbol)] = ord(symbol)
+    for symbol, alias in ALIASES.items():
+        if symbol not in defined and alias in defined:
+            source[ord(symbol)] = ord(alias)
+    for code in range(ord("a"), ord("z") + 1):
+        if source[code] == 256:
+            source[code] = source[ord(chr(code).upper())]
+
+    return np.ascontiguousarray(base[np.ix_(source, source)])
+
+def cache_path(matrix_file, cache_dir=None):
+    """
+    Summary:
+        Gets the path of the compiled version of a matrix file, keyed by the hash of its contents.
+
+    Parameters:
+        matrix_file: Path to the scoring matrix file.
+        cache_dir: Folder of the compiled matrices (default: $MSA_MATRIX_CACHE, or a ".compiled" folder next to the matrix file).
+
+    Returns:
+        path: Path of the compiled matrix file.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get("MSA_MATRIX_CACHE", os.path.join(os.path.dirname(os.path.abspath(matrix_file)), ".compiled"))
+
+    with open(matrix_file, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+
+    return os.path.join(cache_dir, f"{os.path.basename(matrix_file)}.v{FORMAT_VERSION}.{digest}.npy")
+
+def load_compiled(matrix_file, cache_dir=None):
+    """
+    Summary:
+        Loads the dense table of a scoring matrix, memory-mapping its cached compiled version.
+        If there is no cached version, the matrix file is parsed, compiled and saved to the cache.
+        If the cached version cannot be read (ex.: written by another user, truncated or corrupt), the matrix is compiled again in memory.
+
+    Parameters:
+        matrix_file: Path to the scoring matrix file.
+        cache_dir: Folder of the compiled matrices (see cache_path).
+
+    Returns:
+        table: 256x256 int32 table (read-only).
+    """
+    path = cache_path(matrix_file, cache_dir)
+    if os.path.exists(path):
+        try:
+            table = np.load(path, mmap_mode="r")
+            if table.shape == (256, 256) and table.dtype == np.int32:
+                return table
+        except (OSError, ValueError, EOFError):
+            pass
+        # A cached table that cannot be used is never trusted, the matrix file is compiled again
+        return read_only(compile_file(matrix_file))
+
+    table = compile_file(matrix_file)
+
+    # Write to a temporary file first so concurrent runs never read a half written table
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, table)
+        # mkstemp only lets its owner read the file, but the cache folder may be shared by other users
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError:
+        # A read-only matrix folder only means the table is compiled again next time
+        if tmp_path is not None and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return read_only(table)
+
+    return np.load(path, mmap_mode="r")
+
+def compile_file(matrix_file):
+    """
+    Summary:
+        Parses and compiles a scoring matrix file, without using the cache.
+
+    Parameters:
+        matrix_file: Path to the scoring matrix file.
+
+    Returns:
+        table: 256x256 numpy array (int32).
+    """
+    with open(matrix_file) as f:
+        return compile_matrix(read_scoring_matrix(f, matrix_file))
+
+def read_only(table):
+    """
+    Summary:
+        Marks a compiled table as read-only, like the memory-mapped tables of the cache.
+
+    Parameters:
+        table: Compiled table.
+
+    Returns:
+        table: The same table, read-only.
+    """
+    table.setflags(write=False)
+    return table
@@ -0,0 +1,160 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+
+# File signature of every supported compression format (bgzip files are gzip files with extra fields)
+MAGIC = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "xz"}
+
+# Extension and default level of every codec that can be used to write files
+CODECS = {"gzip": (".gz", 6), "bgzip": (".gz", 6), "bz2": (".bz2", 9), "xz": (".xz", 6)}
+
+# Extensions removed from file names before the FASTA extension
+COMPRESSED_EXTENSIONS = (".gz", ".bgz", ".bz2", ".xz")
+
+def detect(path):
+    """
+    Summary:
+        Detects the compression format of a file from its first bytes.
+
+    Parameters:
+        path: Path of the file.
+
+    Returns:
+        codec: "gzip", "bz2" or "xz", or None if the file is not compressed.
+    """
+    with open(path, "rb") as f:
+        start = f.read(6)
+    for magic, codec in MAGIC.items():
+        if start.startswith(magic):
+            return codec
+    return None
+
+def open_input(path, mode="rb"):
+    """
+    Summary:
+        Opens a file for reading, decompressing it on the fly if it is compressed (gzip, bgzip, bz2 or xz).
+
+    Parameters:
+        path: Path of the file.
+        mode: "rb" for bytes or "rt" for text (default: "rb").
+
+    Returns:
+        file: File object with the decompressed contents.
+    """
+    codec = detect(path)
+    if codec == "gzip":
+        return gzip.open(path, mode)
+    if codec == "bz2":
+        return bz2.open(path, mode)
+    if codec == "xz":
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+def open_output(path, codec=None, level=None):
+    """
+    Summary:
+        Opens a file for writing bytes, compressing them on the fly with the given codec.
+
+    Parameters:
+        path: Path of the file (see output_path for the extension).
+        codec: "gzip", "bgzip", "bz2" or "xz", or None to write an uncompressed file (default: None).
+        level: Compression level, or None for the default level of the codec (default: None).
+
+    Returns:
+        file: Writable binary file object.
+    """
+    if codec is None:
+        return open(path, "wb")
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec '{codec}', choose one of: {', '.join(CODECS)}")
+
+    level = CODECS[codec][1] if level is None else level
+    if codec == "gzip":
+        return gzip.open(path, "wb", compresslevel=level)
+    if codec == "bgzip":
+        # Block gzip (indexable with samtools/tabix), provided by Biopython
+        from Bio import bgzf
+        return bgzf.BgzfWriter(path, "wb", compresslevel=level)
+    if codec == "bz2":
+        return bz2.open(path, "wb", compresslevel=level)
+    return lzma.open(path, "wb", preset=level)
+
+def output_path(path, codec=None):
+    """
+    Summary:
+        Adds the extension of a codec to a file path.
+
+    Parameters:
+        path: Path of the uncompressed file.
+        codec: Compression codec, or None (default: None).
+
+    Returns:
+        path: Path of the compressed file.
+    """
+    return path + CODECS[codec][0] if codec else path
+
+def compress_file(path, codec=None, level=None):
+    """
+    Summary:
+        Compresses a file with the given codec, replacing the original file.
+
+    Parameters:
+        path: Path of the uncompressed file.
+        codec: Compression codec, or None to leave the file as it is (default: None).
+        level: Compression level, or None for the default level of the codec (default: None).
+
+    Returns:
+        path: Path of the compressed file.
+    """
+    if codec is None:
+        return path
+
+    compressed = output_path(path, codec)
+    with open(path, "rb") as source, open_output(compressed, codec, level) as target:
+        shutil.copyfileobj(source, target)
+    os.remove(path)
+
+    return compressed
+
+def strip_extensions(path):
+    """
+    Summary:
+        Removes the compression extension and the file extension of a path (ex.: "data/x.fasta.gz" -> "data/x").
+
+    Parameters:
+        path: Path of the file.
+
+    Returns:
+        path: Path without extensions.
+    """
+    folder, name = os.path.split(path)
+    for extension in COMPRESSED_EXTENSIONS:
+        if name.lower().endswith(extension):
+            name = name[:-len(extension)]
+            break
+    return os.path.join(folder, os.path.splitext(name)[0])
+
+def decompress_to_scratch(path, scratch_dir):
+    """
+    Summary:
+        Decompresses a compressed file once into a scratch folder, streaming it, so it can be given to programs that only read plain files.
+
+    Parameters:
+        path: Path of the file.
+        scratch_dir: Folder where the decompressed file is written.
+
+    Returns:
+        path: Path of the decompressed file, or the original path if the file is not compressed.
+    """
+    if detect(path) is None:
+        return path
+
+    # Keep the original name (without the compression extension) so the outputs are named after it
+    name = os.path.basename(strip_extensions(path)) + ".fasta"
+    decompressed = os.path.join(scratch_dir, name)
+    with open_input(path) as source, open(decompressed, "wb") as target:
+        shutil.copyfileobj(source, target)
+
+    return decompressed
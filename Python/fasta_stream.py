@@ -0,0 +1,147 @@
+import compression
+import time
+import numpy as np
+
+class streamed_alignment:
+    def __init__(self, chunks, path):
+        """
+        Summary:
+            Alignment read straight from the output pipe of an MSA software. The raw output is only parsed when the sequences are needed,
+            after the MSA software has finished, so the parsing is never counted in its execution time or CPU usage.
+
+        Parameters:
+            chunks: List with the raw bytes read from the pipe, in order.
+            path: Path of the copy of the alignment written to disk, or None if it was not kept.
+        """
+        self.chunks = chunks
+        self.path = path
+        self.names = None
+        self.encoded = None
+        self.parse_wall = None
+        self.parse_cpu = None
+
+    def is_empty(self):
+        """
+        Summary:
+            Checks if the MSA software did not write any FASTA record to the pipe.
+
+        Returns:
+            empty: Whether there is no record in the output.
+        """
+        if self.names is not None:
+            return not self.names
+        return not any(b">" in chunk for chunk in self.chunks)
+
+    def parse(self):
+        """
+        Summary:
+            Parses the raw output into the identifiers and the encoded aligned sequences (only once), recording the wall and CPU time spent on it.
+
+        Returns:
+            names: List containing the identifier of every aligned sequence.
+            encoded: Matrix of byte codes of the aligned sequences (accepted by SPScore and quality in place of a list of strings).
+        """
+        if self.names is None:
+            parse_start = time.perf_counter()
+            start_cpu = time.thread_time()
+
+            data = b"".join(self.chunks)
+            # The raw output is not needed anymore
+            self.chunks = None
+            self.names, self.encoded = parse_records(data)
+
+            self.parse_wall = time.perf_counter() - parse_start
+            self.parse_cpu = time.thread_time() - start_cpu
+
+        return self.names, self.encoded
+
+def drain(stream, chunk_size=1 << 20):
+    """
+    Summary:
+        Reads a binary stream (ex.: the stdout pipe of an MSA software) until it ends, without parsing anything,
+        so the process writing to it never waits for a full pipe.
+
+    Parameters:
+        stream: Binary file object.
+        chunk_size: Maximum number of bytes of each read (default: 1 MiB).
+
+    Returns:
+        chunks: List with the raw bytes read from the stream, in order.
+    """
+    return list(iter(lambda: stream.read1(chunk_size), b""))
+
+def write_copy(chunks, path, codec=None, level=None):
+    """
+    Summary:
+        Writes the raw output of an MSA software to a file.
+
+    Parameters:
+        chunks: List with the raw bytes read from the pipe.
+        path: Path of the file.
+        codec: Compression codec of the file (default: None, uncompressed).
+        level: Compression level, or None for the default level of the codec (default: None).
+
+    Returns:
+        path: Path of the written file.
+    """
+    with compression.open_output(path, codec, level) as out:
+        for chunk in chunks:
+            out.write(chunk)
+    return path
+
+def parse_records(data):
+    """
+    Summary:
+        Parses aligned FASTA records from the raw bytes of an alignment straight into the matrix of byte codes used by the scorer,
+        so the sequences are never turned into strings. Line breaks and spaces inside the sequences are ignored.
+
+    Parameters:
+        data: Bytes of the aligned FASTA records.
+
+    Returns:
+        names: List containing the identifier of every aligned sequence.
+        encoded: 2D numpy array (uint8) with the upper case byte codes of every aligned sequence, one row per sequence.
+
+    Raises:
+        ValueError: If the aligned sequences do not all have the same length.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    # First and last byte (the line break is excluded) of every line
+    line_breaks = np.flatnonzero(buffer == ord("\n"))
+    line_starts = np.concatenate(([0], line_breaks + 1))
+    line_ends = np.concatenate((line_breaks, [len(buffer)]))
+    # A line break at the very end does not start another line
+    not_empty = line_starts < len(buffer)
+    line_starts, line_ends = line_starts[not_empty], line_ends[not_empty]
+
+    # Every record starts with a header line
+    headers = buffer[line_starts] == ord(">")
+    header_starts, header_ends = line_starts[headers], line_ends[headers]
+    if not len(header_starts):
+        return [], np.zeros((0, 0), dtype=np.uint8)
+
+    names = []
+    for start, end in zip(header_starts, header_ends):
+        title = data[start + 1:end].split()
+        names.append(title[0].decode("utf-8", "replace") if title else "")
+
+    # Sequence bytes: not in a header line, not a space or line break, and not written before the first record
+    in_header = np.zeros(len(buffer) + 1, dtype=np.int8)
+    in_header[header_starts] += 1
+    in_header[header_ends] -= 1
+    is_sequence = (np.cumsum(in_header[:-1], dtype=np.int8) == 0) & (buffer > ord(" "))
+    is_sequence[:header_starts[0]] = False
+
+    # Number of sequence bytes of every record
+    lengths = np.add.reduceat(is_sequence.view(np.uint8), header_starts, dtype=np.int64)
+    if (lengths != lengths[0]).any():
+        raise ValueError("Sequences must all be the same length")
+
+    # A single copy of the sequence bytes, turned into upper case in place
+    encoded = buffer[is_sequence]
+    encoded[(encoded >= ord("a")) & (encoded <= ord("z"))] -= ord("a") - ord("A")
+    # Bytes outside ASCII become '?', which has no score in any matrix (same as sp_kernel.encode_rows)
+    encoded[encoded >= 128] = ord("?")
+
+    return names, encoded.reshape(len(names), int(lengths[0]))
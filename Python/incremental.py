@@ -0,0 +1,419 @@
+from SPScore import SPScore
+import argparse
+import hashlib
+import os
+import numpy as np
+import sp_kernel
+
+class incremental:
+    def __init__(self, sp):
+        """
+        Summary:
+            Initializes the incremental scorer, which updates the SP-Score of an alignment when new sequences are added to it
+            (ex.: MAFFT --add), without scoring again the pairs of sequences that were already there.
+
+        Parameters:
+            sp: SPScore object with the scoring matrix and the gap penalties.
+        """
+        self.sp = sp
+        self.gap_open, self.gap_ext = sp.gap_parameters()
+        # Identifies the scoring scheme, so a state saved with another matrix or other gap penalties is never reused
+        self.scheme = hashlib.sha256(np.ascontiguousarray(sp.dense_matrix).tobytes() + f"{self.gap_open},{self.gap_ext}".encode()).hexdigest()
+
+    def make_state(self, names, encoded, sp_score):
+        """
+        Summary:
+            Creates the score state of an alignment. Every structure uses compact coordinates, i.e., only the columns with at least one residue,
+            since columns where every sequence has a gap never change a pairwise score.
+
+        Parameters:
+            names: List containing the identifier of every aligned sequence.
+            encoded: Matrix of byte codes of the alignment.
+            sp_score: SP-Score of the alignment.
+
+        Returns:
+            state: Dictionary with the SP-Score, the identifiers, the column hashes, the column profiles and the gap-run index.
+        """
+        gaps = encoded == sp_kernel.GAP
+        compact = encoded[:, ~gaps.all(axis=0)] if encoded.size else encoded
+        compact_gaps = compact == sp_kernel.GAP
+        num_columns = compact.shape[1]
+
+        # Column profiles: number of copies of every symbol of the alphabet in each column
+        alphabet = np.unique(compact[~compact_gaps]).astype(np.uint8)
+        profile = self.count_symbols(compact, alphabet)
+
+        # Number of sequences with residues in two consecutive columns (their gap runs start if columns are inserted between them)
+        adjacent = (~compact_gaps[:, :-1] & ~compact_gaps[:, 1:]).sum(axis=0) if num_columns > 1 else np.zeros(0, dtype=np.int64)
+
+        # Gap-run index: first and last column of every run of gaps of every sequence
+        run_starts, run_ends = self.gap_runs(compact_gaps)
+        order = np.argsort(run_starts, kind="stable")
+
+        return {
+            "sp_score": int(sp_score),
+            "names": np.array(names, dtype=str),
+            "scheme": np.array(self.scheme),
+            "hashes": self.column_hashes(compact),
+            "alphabet": alphabet,
+            "profile": profile,
+            "adjacent": adjacent.astype(np.int64),
+            "run_starts": run_starts[order].astype(np.int64),
+            "run_ends": run_ends[order].astype(np.int64)
+        }
+
+    def extend_state(self, state, positions, names, encoded, sp_score):
+        """
+        Summary:
+            Creates the score state of an alignment made by adding sequences to the alignment of a score state, whose sequences were only re-gapped.
+            The saved profiles, counts and gap runs are moved to their new compact columns and only the new sequences are counted,
+            so the existing sequences are only read again to hash the columns.
+
+        Parameters:
+            state: Score state of the existing sequences.
+            positions: Column of the new alignment of every compact column of the state.
+            names: List containing the identifier of every aligned sequence, the existing ones first, in the order of the state.
+            encoded: Matrix of byte codes of the alignment, with the rows in the same order as names.
+            sp_score: SP-Score of the alignment.
+
+        Returns:
+            state: Score state of the alignment, equal to the one created by make_state.
+        """
+        num_existing = len(state["names"])
+        added = encoded[num_existing:]
+
+        # Columns with a residue in some sequence, and the compact column of every saved column in the new state
+        has_residue = np.zeros(encoded.shape[1], dtype=bool)
+        has_residue[positions] = True
+        has_residue |= (added != sp_kernel.GAP).any(axis=0)
+        num_columns = int(has_residue.sum())
+        moved = (np.cumsum(has_residue) - 1)[positions]
+        num_saved = len(moved)
+
+        added = added[:, has_residue]
+        added_gaps = added == sp_kernel.GAP
+
+        # Column profiles: the saved counts in their new columns, plus the symbols of the new sequences
+        alphabet = np.union1d(state["alphabet"], np.unique(added[~added_gaps])).astype(np.uint8)
+        profile = self.count_symbols(added, alphabet)
+        profile[np.ix_(moved, np.searchsorted(alphabet, state["alphabet"]))] += state["profile"]
+        residues = state["profile"].sum(axis=1)
+
+        # Saved columns that are still consecutive keep their counts, since the existing sequences only have gaps in the inserted columns
+        adjacent = np.zeros(max(num_columns - 1, 0), dtype=np.int64)
+        if num_columns > 1:
+            adjacent += (~added_gaps[:, :-1] & ~added_gaps[:, 1:]).sum(axis=0)
+        if num_saved > 1:
+            consecutive = moved[1:] == moved[:-1] + 1
+            adjacent[moved[:-1][consecutive]] += state["adjacent"][consecutive]
+
+        # Saved gap runs grow over the inserted columns around them
+        run_starts = state["run_starts"]
+        run_ends = state["run_ends"]
+        starts = [np.where(run_starts > 0, moved[np.maximum(run_starts - 1, 0)] + 1, 0)]
+        ends = [np.where(run_ends < num_saved - 1, moved[np.minimum(run_ends + 1, num_saved - 1)] - 1, num_columns - 1)]
+
+        # Runs made only of inserted columns, for the existing sequences with residues on both sides (or only on one side, at the ends)
+        if num_saved == 0:
+            copies = np.full(int(num_columns > 0), num_existing)
+            first, last = np.zeros(len(copies), dtype=np.int64), np.full(len(copies), num_columns - 1)
+        else:
+            # Gaps after column i of the state, with one more "column" at the start (before column 0)
+            first = np.concatenate(([0], moved + 1))
+            last = np.concatenate((moved, [num_columns])) - 1
+            copies = np.concatenate(([residues[0]], state["adjacent"], [residues[-1]]))
+        inserted = (first <= last) & (copies > 0)
+        starts.append(np.repeat(first[inserted], copies[inserted]))
+        ends.append(np.repeat(last[inserted], copies[inserted]))
+
+        # Gap runs of the new sequences
+        added_starts, added_ends = self.gap_runs(added_gaps)
+        starts.append(added_starts)
+        ends.append(added_ends)
+
+        run_starts = np.concatenate(starts).astype(np.int64)
+        run_ends = np.concatenate(ends).astype(np.int64)
+        order = np.argsort(run_starts, kind="stable")
+
+        return {
+            "sp_score": int(sp_score),
+            "names": np.array(names, dtype=str),
+            "scheme": np.array(self.scheme),
+            "hashes": self.column_hashes(encoded[:, has_residue]),
+            "alphabet": alphabet,
+            "profile": profile,
+            "adjacent": adjacent,
+            "run_starts": run_starts[order],
+            "run_ends": run_ends[order]
+        }
+
+    def count_symbols(self, compact, alphabet):
+        """
+        Summary:
+            Counts the copies of every symbol of an alphabet in each column of an encoded alignment.
+
+        Parameters:
+            compact: Matrix of byte codes of the sequences.
+            alphabet: Array (uint8) with the symbols to be counted.
+
+        Returns:
+            profile: Matrix (int64) with one row per column and one column per symbol.
+        """
+        profile = np.zeros((compact.shape[1], len(alphabet)), dtype=np.int64)
+        for k, symbol in enumerate(alphabet):
+            profile[:, k] = (compact == symbol).sum(axis=0)
+        return profile
+
+    def gap_runs(self, gaps):
+        """
+        Summary:
+            Finds the first and last column of every run of gaps of every sequence.
+
+        Parameters:
+            gaps: Boolean matrix marking the gaps of the sequences.
+
+        Returns:
+            run_starts: Array with the first column of every run (sorted by sequence).
+            run_ends: Array with the last column of every run.
+        """
+        padded = np.zeros((gaps.shape[0], gaps.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = gaps
+        changes = np.diff(padded, axis=1)
+        return np.nonzero(changes == 1)[1], np.nonzero(changes == -1)[1] - 1
+
+    def column_hashes(self, compact):
+        """
+        Summary:
+            Hashes every column of an encoded alignment, to find out if the columns of the existing sequences changed.
+
+        Parameters:
+            compact: Matrix of byte codes of the sequences (without gap-only columns).
+
+        Returns:
+            hashes: Array (uint64) with the hash of every column.
+        """
+        columns = np.ascontiguousarray(compact.T)
+        digests = b"".join(hashlib.blake2b(column.tobytes(), digest_size=8).digest() for column in columns)
+        return np.frombuffer(digests, dtype=np.uint64)
+
+    def build(self, names, rows):
+        """
+        Summary:
+            Scores an alignment from scratch and creates its score state.
+
+        Parameters:
+            names: List containing the identifier of every aligned sequence.
+            rows: List containing every aligned sequence as an upper case string, or matrix of byte codes.
+
+        Returns:
+            state: Score state of the alignment (the SP-Score is state["sp_score"]).
+        """
+        encoded = sp_kernel.encode_rows(rows)
+        return self.make_state(names, encoded, self.sp.score_rows(encoded))
+
+    def update(self, state, names, rows):
+        """
+        Summary:
+            Calculates the SP-Score of an alignment made by adding sequences to the alignment of a score state.
+            When the existing sequences were only re-gapped (columns where all of them have gaps were inserted), the SP-Score is the saved one,
+            plus the scores between each new sequence and all the existing ones (from the column profiles and the gap-run index, O(k*(L*A + G))
+            for k new sequences, L columns, an alphabet of A symbols and G gap runs, with G <= N*L for N existing sequences),
+            plus the scores among the new sequences. The existing sequences are still read once to check and hash their columns (O(N*L)),
+            but the state is extended with the counts and gap runs of the new sequences only (O(k*L*A + G)).
+            Otherwise (an existing sequence is missing, a column of the existing sequences changed, or another scoring scheme was used),
+            any pairwise score may have changed and the alignment is scored again from scratch.
+
+        Parameters:
+            state: Score state of the previous alignment (from build, update or load_state).
+            names: List containing the identifier of every aligned sequence of the new alignment.
+            rows: List containing every aligned sequence of the new alignment as an upper case string, or matrix of byte codes.
+
+        Returns:
+            state: Score state of the new alignment (the SP-Score is state["sp_score"]).
+            incremental: Whether the SP-Score was updated incrementally (False if it was calculated from scratch).
+        """
+        index = {name: i for i, name in enumerate(names)}
+        existing_names = list(state["names"])
+        if str(state["scheme"]) != self.scheme or len(index) != len(names) or any(name not in index for name in existing_names):
+            return self.build(names, rows), False
+
+        encoded = sp_kernel.encode_rows(rows)
+        existing = encoded[[index[name] for name in existing_names]] if existing_names else np.zeros((0, encoded.shape[1]), dtype=np.uint8)
+
+        # Columns where some existing sequence has a residue, which must be exactly the columns saved in the state
+        kept = ~(existing == sp_kernel.GAP).all(axis=0)
+        if kept.sum() != len(state["hashes"]) or not np.array_equal(self.column_hashes(existing[:, kept]), state["hashes"]):
+            return self.build(names, rows), False
+
+        # Position of every compact column in the new alignment
+        positions = np.nonzero(kept)[0]
+        known = set(existing_names)
+        new_ids = [i for i, name in enumerate(names) if name not in known]
+
+        sp_score = state["sp_score"]
+        for i in new_ids:
+            sp_score += self.cross_score(state, positions, encoded[i])
+        sp_score += self.sp.score_rows(encoded[new_ids])
+
+        # The new state keeps the existing sequences first, in the order of the saved one
+        order = [index[name] for name in existing_names] + new_ids
+        return self.extend_state(state, positions, existing_names + [names[i] for i in new_ids], encoded[order], sp_score), True
+
+    def cross_score(self, state, positions, row):
+        """
+        Summary:
+            Calculates the sum of the pairwise scores between a new sequence and every existing sequence of a score state,
+            with exactly the same affine gap rules as SPScore.pairwise_score, but without looking at the existing sequences themselves.
+
+        Parameters:
+            state: Score state of the existing sequences.
+            positions: Column of the new alignment of every compact column of the state.
+            row: Byte codes of the new sequence.
+
+        Returns:
+            score: Sum of the pairwise scores.
+        """
+        num_existing = len(state["names"])
+        num_columns = len(positions)
+        if num_existing == 0 or num_columns == 0:
+            return 0
+
+        profile = state["profile"]
+        residues = profile.sum(axis=1)
+        residue_prefix = np.concatenate(([0], np.cumsum(residues)))
+        run_starts = state["run_starts"]
+        run_ends = state["run_ends"]
+
+        is_residue = row != sp_kernel.GAP
+        row_prefix = np.concatenate(([0], np.cumsum(is_residue)))
+
+        def penalty(counts, copies):
+            # Every gap run closed with 'counts' positions costs gap_open + counts * gap_ext, and empty runs cost nothing
+            counts = np.asarray(counts, dtype=np.int64)
+            copies = np.asarray(copies, dtype=np.int64)
+            return int(((self.gap_open + counts * self.gap_ext) * copies * (counts > 0)).sum())
+
+        # Matches/mismatches: each residue of the new sequence against the profile of its column
+        symbols = row[positions]
+        matched = is_residue[positions]
+        scores = np.asarray(self.sp.dense_matrix)[symbols[matched]][:, state["alphabet"]]
+        score = int((scores.astype(np.int64) * profile[matched]).sum())
+
+        # Gap runs of the new sequence, closed by its next residue (runs at the end of the alignment are never closed)
+        padded = np.concatenate(([0], (~is_residue).astype(np.int8), [0]))
+        changes = np.diff(padded)
+        gap_starts = np.nonzero(changes == 1)[0]
+        gap_ends = np.nonzero(changes == -1)[0] - 1
+        closed = gap_ends < len(row) - 1
+
+        # Compact columns inside every run: only existing sequences with residues there are paired against the gap
+        firsts = np.searchsorted(positions, gap_starts[closed], "left")
+        lasts = np.searchsorted(positions, gap_ends[closed], "right") - 1
+        inside = firsts <= lasts
+        firsts = firsts[inside]
+        lasts = lasts[inside]
+        if len(firsts):
+            # Existing sequences with gaps in all of them are not paired against the gap at all
+            covered = self.covered_counts(state, firsts, lasts)
+            paired = residue_prefix[lasts + 1] - residue_prefix[firsts]
+            score += int((num_existing - covered).sum()) * self.gap_open + self.gap_ext * int(paired.sum())
+
+        # Gap runs of the existing sequences, extended over the inserted columns, closed by their next residue
+        closed = run_ends < num_columns - 1
+        starts = run_starts[closed]
+        ends = run_ends[closed]
+        new_starts = np.where(starts > 0, positions[np.maximum(starts - 1, 0)] + 1, 0)
+        new_ends = positions[ends + 1] - 1
+        score += penalty(row_prefix[new_ends + 1] - row_prefix[new_starts], 1)
+
+        # Runs made only of inserted columns, for the existing sequences with residues on both sides (or right after, at the start)
+        score += penalty(row_prefix[positions[0]], residues[0])
+        if num_columns > 1:
+            score += penalty(row_prefix[positions[1:]] - row_prefix[positions[:-1] + 1], state["adjacent"])
+
+        return score
+
+    def covered_counts(self, state, firsts, lasts):
+        """
+        Summary:
+            Counts, for every range of compact columns, the existing sequences with a gap in all of its columns, in O(G + L)
+            for G gap runs and L compact columns. A sequence's gap runs never overlap, so every covering run is one sequence.
+            The ranges are disjoint and sorted (they come from the gap runs of one sequence), so a run that holds the first column of
+            several ranges also holds the whole of every range but the last one, and the counts are built from a difference array.
+
+        Parameters:
+            state: Score state of the existing sequences.
+            firsts: Array with the first compact column of every range (in increasing order).
+            lasts: Array with the last compact column of every range.
+
+        Returns:
+            covered: Array with the number of existing sequences with gaps in the whole of every range.
+        """
+        run_starts = state["run_starts"]
+        run_ends = state["run_ends"]
+        num_ranges = len(firsts)
+
+        # before[c]: number of ranges whose first column comes before the compact column c
+        before = np.zeros(len(state["hashes"]) + 1, dtype=np.int64)
+        before[firsts + 1] = 1
+        before = np.cumsum(before)
+
+        # Ranges whose first column is inside every gap run: lo, ..., hi - 1
+        lo = before[run_starts]
+        hi = before[run_ends + 1]
+        holds = hi > lo
+        lo = lo[holds]
+        last = hi[holds] - 1
+
+        # The run covers every range from lo to last - 1, and the last one only if it does not end before it
+        stop = last + (run_ends[holds] >= lasts[last])
+        return np.cumsum(np.bincount(lo, minlength=num_ranges + 1) - np.bincount(stop, minlength=num_ranges + 1))[:num_ranges]
+
+    def save_state(self, state, path):
+        """
+        Summary:
+            Saves a score state to a compressed numpy file.
+
+        Parameters:
+            state: Score state to be saved.
+            path: Path of the file.
+        """
+        with open(path, "wb") as file:
+            np.savez_compressed(file, **state)
+
+    def load_state(self, path):
+        """
+        Summary:
+            Loads a score state saved by save_state.
+
+        Parameters:
+            path: Path of the file.
+
+        Returns:
+            state: Score state.
+        """
+        with np.load(path) as data:
+            state = {key: data[key] for key in data.files}
+        state["sp_score"] = int(state["sp_score"])
+        return state
+
+# Just ensuring the code is only executed when the script is run as a standalone program.
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Calculates the SP-Score of an alignment, reusing the saved score state of the alignment it was extended from.")
+    parser.add_argument("alignment", type=str, help="Aligned FASTA file.")
+    parser.add_argument("matrix", type=str, help="Scoring matrix used to evaluate the SP-Score (ex.: BLOSUM62)")
+    parser.add_argument("--state", type=str, required=True, help="Score state file. It is read if it exists and always overwritten with the state of this alignment.")
+    args = parser.parse_args()
+
+    sp = SPScore(args.matrix)
+    inc = incremental(sp)
+    names, rows = sp.read_records(args.alignment)
+
+    if os.path.exists(args.state):
+        state, updated = inc.update(inc.load_state(args.state), names, rows)
+    else:
+        state, updated = inc.build(names, rows), False
+
+    inc.save_state(state, args.state)
+    print(f"SP-Score: {state['sp_score']} ({'incremental update' if updated else 'full calculation'})")
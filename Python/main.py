@@ -1,9 +1,14 @@
 from SPScore import SPScore
 from msa_softwares import msa_softwares
 from analysis import analysis
+from tracing import tracing
+from fasta_stream import streamed_alignment
+from quality import quality
+import compression
 import argparse
 import os
 import shutil
+import tempfile
 
 def uniquify(path):
     """
@@ -43,136 +48,182 @@ def safe_sum(values):
         return "N/A"
     return sum(values)
 
+def evaluate_alignment(sp, engine, aligned_file, estimate_settings=None, name="The alignment"):
+    """
+    Summary:
+        Parses an alignment once and calculates its SP-Score (exact or estimated) and every quality metric from the same sequences.
+
+    Parameters:
+        sp: SPScore object used to parse and score the alignment.
+        engine: quality object used to calculate the quality metrics.
+        aligned_file: Path to the aligned file (or streamed_alignment), None if the MSA software failed.
+        estimate_settings: Settings of the SP-Score estimation, None to calculate the exact SP-Score (default: None).
+        name: Name of the MSA software, shown in the warnings (default: "The alignment").
+
+    Returns:
+        sp_score: SP-Score of the alignment, 'N/A' if there is no alignment.
+        sp_error: Half-width of the confidence interval of an estimated SP-Score, None otherwise.
+        metrics: Dictionary with the value of every quality metric.
+    """
+    if aligned_file is None:
+        return "N/A", None, {metric: "N/A" for metric in engine.metric_names()}
+
+    names, rows = sp.read_records(aligned_file)
+    sp_score, sp_error = sp.score_or_estimate(rows, estimate_settings)
+
+    with sp.tracer.span("quality"):
+        metrics = engine.evaluate(names, rows, name)
+
+    return sp_score, sp_error, metrics
+
 # Just ensuring the code is only executed when the script is run as a standalone program.
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("dataset", type=str, help="Dataset containing the FASTA sequences that will be aligned by the MSA softwares.")
     parser.add_argument("matrix", type=str, help="Scoring matrix used to evaluate the SP-Score of each MSA software (ex.: BLOSUM62)")
+    parser.add_argument("--reference", type=str, default=None, help="Reference alignment of the dataset (ex.: from BAliBASE) used to calculate the TC Score and the SP Agreement of every MSA software.")
+    parser.add_argument("--trace", action="store_true", help="Time every stage of the pipeline and save a Chrome trace and a stage summary in the output folder.")
+    parser.add_argument("--stream", action="store_true", help="Parse the alignments straight from the output of the MSA softwares that can write to a pipe, without intermediate files.")
+    parser.add_argument("--keep-alignments", action="store_true", help="Keep the alignments of the last run in the output folder.")
+    parser.add_argument("--compress", type=str, default="none", choices=["none"] + list(compression.CODECS), help="Compression codec of the kept alignments (default: none).")
+    parser.add_argument("--compress-level", type=int, default=None, help="Compression level of the kept alignments (default: the default level of the codec).")
+    parser.add_argument("--estimate", action="store_true", help="Estimate the SP-Scores from a random sample of pairs of sequences instead of scoring every pair (for huge alignments).")
+    parser.add_argument("--rel-error", type=float, default=0.01, help="Relative error at which the SP-Score sampling stops (default: 0.01).")
+    parser.add_argument("--time-budget", type=float, default=None, help="Maximum time (in seconds) spent sampling each SP-Score (default: no limit).")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the estimated SP-Scores (default: 0.95).")
+    parser.add_argument("--stratify", action="store_true", help="Sample the pairs of sequences by strata of sequence length.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed used to sample the pairs of sequences.")
     args = parser.parse_args()
 
     # Creating instances for the classes using the needed parameters
-    sp = SPScore(args.matrix)
-    msa = msa_softwares()
+    tracer = tracing(args.trace)
+    sp = SPScore(args.matrix, tracer)
+    codec = None if args.compress == "none" else args.compress
+    msa = msa_softwares(codec, args.compress_level)
     an = analysis()
+
+    # Parse the reference alignment once, if there is one
+    engine = quality(sp.read_records(args.reference) if args.reference else None)
+
+    # Compressed datasets are decompressed once to a scratch folder, since the MSA softwares only read plain files
+    scratch = tempfile.TemporaryDirectory()
+    dataset = compression.decompress_to_scratch(args.dataset, scratch.name)
+
+    # Functions that run every MSA software
+    aligners = {"MAFFT": msa.mafft, "MUSCLE": msa.muscle, "KAlign2": msa.kalign2, "ClustalOmega": msa.clustalo, "T-COFFEE": msa.tcoffee, "PRANK": msa.prank}
+    # Order in which the MSA softwares are executed
+    run_order = ["MAFFT", "MUSCLE", "ClustalOmega", "KAlign2", "T-COFFEE", "PRANK"]
     
     # Create arrays to store every parameter value from the 5 attempts
     all_memories = {"MAFFT": [], "MUSCLE": [], "KAlign2": [], "ClustalOmega": [], "T-COFFEE": [], "PRANK": []}
     all_times = {"MAFFT": [], "MUSCLE": [], "KAlign2": [], "ClustalOmega": [], "T-COFFEE": [], "PRANK": []}
     all_cpus = {"MAFFT": [], "MUSCLE": [], "KAlign2": [], "ClustalOmega": [], "T-COFFEE": [], "PRANK": []}
     all_sp_scores = {"MAFFT": [], "MUSCLE": [], "KAlign2": [], "ClustalOmega": [], "T-COFFEE": [], "PRANK": []}
+    all_sp_errors = {"MAFFT": [], "MUSCLE": [], "KAlign2": [], "ClustalOmega": [], "T-COFFEE": [], "PRANK": []}
+    all_quality = {metric: {"MAFFT": [], "MUSCLE": [], "KAlign2": [], "ClustalOmega": [], "T-COFFEE": [], "PRANK": []} for metric in engine.metric_names()}
+
+    # Settings of the SP-Score estimation
+    estimate_settings = {"rel_error": args.rel_error, "time_budget": args.time_budget, "confidence": args.confidence, "stratified": args.stratify, "seed": args.seed}
     
+    # Alignment files that will be moved to the output folder
+    kept_files = set()
+
     # Start running every MSA software 5 times
     for i in range(5):
         print(f"Run {i + 1}...\n")
         
         # Get info from all MSA softwares
-        mafft_info = msa.mafft(args.dataset)
-        muscle_info = msa.muscle(args.dataset)
-        clustalo_info = msa.clustalo(args.dataset)
-        kalign2_info = msa.kalign2(args.dataset)
-        tcoffee_info = msa.tcoffee(args.dataset)
-        prank_info = msa.prank(args.dataset)
+        infos = {}
+        for name in run_order:
+            # Streamed alignments are only parsed when they are scored, so parsing is traced in the "parse" stage like for the files
+            with tracer.span("align", tool=name, replicate=i + 1):
+                infos[name] = aligners[name](dataset, args.stream, args.keep_alignments)
         
         # Create a dictionary to store the path for every alignment, if they exist
-        msa_files = {
-            "MAFFT": mafft_info[0],
-            "MUSCLE": muscle_info[0],
-            "KAlign2": kalign2_info[0],
-            "ClustalOmega": clustalo_info[0],
-            "T-COFFEE": tcoffee_info[0],
-            "PRANK": prank_info[0]
-        }
+        msa_files = {name: info[0].path if isinstance(info[0], streamed_alignment) else info[0] for name, info in infos.items()}
         
         # Add parameters to respective dictionaries
-        if mafft_info:
-            mafft_sp_score = sp.sp_score(mafft_info[0])
-            all_memories["MAFFT"].append(mafft_info[1])
-            all_times["MAFFT"].append(mafft_info[2])
-            all_cpus["MAFFT"].append(mafft_info[3])
-            all_sp_scores["MAFFT"].append(mafft_sp_score)
-        if muscle_info:
-            muscle_sp_score = sp.sp_score(muscle_info[0])
-            all_memories["MUSCLE"].append(muscle_info[1])
-            all_times["MUSCLE"].append(muscle_info[2])
-            all_cpus["MUSCLE"].append(muscle_info[3])
-            all_sp_scores["MUSCLE"].append(muscle_sp_score)
-        if kalign2_info:
-            kalign2_sp_score = sp.sp_score(kalign2_info[0])
-            all_memories["KAlign2"].append(kalign2_info[1])
-            all_times["KAlign2"].append(kalign2_info[2])
-            all_cpus["KAlign2"].append(kalign2_info[3])
-            all_sp_scores["KAlign2"].append(kalign2_sp_score)
-        if clustalo_info:
-            clustalo_sp_score = sp.sp_score(clustalo_info[0])
-            all_memories["ClustalOmega"].append(clustalo_info[1])
-            all_times["ClustalOmega"].append(clustalo_info[2])
-            all_cpus["ClustalOmega"].append(clustalo_info[3])
-            all_sp_scores["ClustalOmega"].append(clustalo_sp_score)
-        if tcoffee_info:
-            tcoffee_sp_score = sp.sp_score(tcoffee_info[0])
-            all_memories["T-COFFEE"].append(tcoffee_info[1])
-            all_times["T-COFFEE"].append(tcoffee_info[2])
-            all_cpus["T-COFFEE"].append(tcoffee_info[3])
-            all_sp_scores["T-COFFEE"].append(tcoffee_sp_score)
-        if prank_info:
-            prank_sp_score = sp.sp_score(prank_info[0])
-            all_memories["PRANK"].append(prank_info[1])
-            all_times["PRANK"].append(prank_info[2])
-            all_cpus["PRANK"].append(prank_info[3])
-            all_sp_scores["PRANK"].append(prank_sp_score)
+        sp_scores = {}
+        sp_errors = {}
+        for name in all_sp_scores.keys():
+            info = infos[name]
+            with tracer.span("score", tool=name, replicate=i + 1):
+                sp_scores[name], sp_errors[name], metrics = evaluate_alignment(sp, engine, info[0], estimate_settings if args.estimate else None, name)
+            for metric, value in metrics.items():
+                all_quality[metric][name].append(value)
+            all_memories[name].append(info[1])
+            all_times[name].append(info[2])
+            all_cpus[name].append(info[3])
+            all_sp_scores[name].append(sp_scores[name])
+            all_sp_errors[name].append(sp_errors[name])
 
         # Print the results for this run
         print(f"\nResults for Run {i + 1}:")
-        if mafft_info:
-            print(f"MAFFT - SP-Score: {mafft_sp_score}, Memory (KB): {mafft_info[1]}, Time (s): {mafft_info[2]}, CPU (%): {mafft_info[3]}")
-        if muscle_info:
-            print(f"MUSCLE - SP-Score: {muscle_sp_score}, Memory (KB): {muscle_info[1]}, Time (s): {muscle_info[2]}, CPU (%): {muscle_info[3]}")
-        if kalign2_info:
-            print(f"KAlign2 - SP-Score: {kalign2_sp_score}, Memory (KB): {kalign2_info[1]}, Time (s): {kalign2_info[2]}, CPU (%): {kalign2_info[3]}")
-        if clustalo_info:
-            print(f"ClustalOmega - SP-Score: {clustalo_sp_score}, Memory (KB): {clustalo_info[1]}, Time (s): {clustalo_info[2]}, CPU (%): {clustalo_info[3]}")
-        if tcoffee_info:
-            print(f"T-COFFEE - SP-Score: {tcoffee_sp_score}, Memory (KB): {tcoffee_info[1]}, Time (s): {tcoffee_info[2]}, CPU (%): {tcoffee_info[3]}")
-        if prank_info:
-            print(f"PRANK - SP-Score: {prank_sp_score}, Memory (KB): {prank_info[1]}, Time (s): {prank_info[2]}, CPU (%): {prank_info[3]}\n")
-
-        # Eliminate the alignments if they exist
+        for name in all_sp_scores.keys():
+            info = infos[name]
+            sp_text = f"{sp_scores[name]:.1f} ± {sp_errors[name]:.1f}" if sp_errors[name] is not None else sp_scores[name]
+            parse_text = f", Pipe Parsing CPU Time (s): {info[0].parse_cpu}" if isinstance(info[0], streamed_alignment) else ""
+            print(f"{name} - SP-Score: {sp_text}, Memory (KB): {info[1]}, Time (s): {info[2]}, CPU (%): {info[3]}{parse_text}")
+        print()
+
+        # Eliminate the alignments if they exist, unless they should be kept
         for i in msa_files.values():
             if i and os.path.exists(i):
-                os.remove(i)
+                if args.keep_alignments:
+                    kept_files.add(i)
+                else:
+                    os.remove(i)
     
     # Create dictionaries to store the best value of each parameter for every MSA software based on the t-test
     best_memories = {}
     best_times = {}
     best_cpus = {}
     best_sp_scores = {}
+    best_sp_errors = {}
+    best_quality = {metric: {} for metric in all_quality}
     
     # Obtain the best values of each parameter based on the t-test and store in his respective dictionary
-    for i in all_memories.keys():
-        best_memories[i] = an.t_test(all_memories[i])
-        best_times[i] = an.t_test(all_times[i])
-        best_cpus[i] = an.t_test(all_cpus[i])
-        best_sp_scores[i] = an.t_test(all_sp_scores[i])
+    with tracer.span("t_test"):
+        for i in all_memories.keys():
+            best_memories[i] = an.t_test(all_memories[i])
+            best_times[i] = an.t_test(all_times[i])
+            best_cpus[i] = an.t_test(all_cpus[i])
+            best_sp_scores[i] = an.t_test(all_sp_scores[i])
+            # Keep the uncertainty of the run whose SP-Score was chosen
+            best_sp_errors[i] = all_sp_errors[i][all_sp_scores[i].index(best_sp_scores[i])] if best_sp_scores[i] is not None else None
+            for metric in all_quality:
+                best_quality[metric][i] = an.t_test(all_quality[metric][i])
 
     # Calculate overall score for every MSA software based on the best values of every parameter
     o_scores = {}
-    for j in best_memories.keys():
-        normalized_sp_score = an.normalized_score(best_sp_scores[j], best_sp_scores)  
-        normalized_memory = an.normalized_score(best_memories[j], best_memories, 1)  
-        normalized_time = an.normalized_score(best_times[j], best_times, 1)  
-        normalized_cpu = an.normalized_score(best_cpus[j], best_cpus, 1)
-        
-        # Sum of all normalized values, max possible score is 8
-        o_scores[j] = safe_sum([normalized_sp_score + normalized_memory + normalized_time + normalized_cpu])
+    with tracer.span("normalization"):
+        for j in best_memories.keys():
+            normalized_sp_score = an.normalized_score(best_sp_scores[j], best_sp_scores)  
+            normalized_memory = an.normalized_score(best_memories[j], best_memories, 1)  
+            normalized_time = an.normalized_score(best_times[j], best_times, 1)  
+            normalized_cpu = an.normalized_score(best_cpus[j], best_cpus, 1)
+            normalized_values = [normalized_sp_score, normalized_memory, normalized_time, normalized_cpu]
+
+            # Agreement with the reference alignment (higher is better) → range [0,1]
+            if engine.reference is not None:
+                normalized_values.append(an.normalized_score(best_quality["TC Score"][j], best_quality["TC Score"], scale=1))
+                normalized_values.append(an.normalized_score(best_quality["SP Agreement"][j], best_quality["SP Agreement"], scale=1))
+            
+            # Sum of all normalized values, max possible score is 8 (10 with a reference alignment)
+            o_scores[j] = safe_sum(normalized_values)
 
 
     # Create barplots containing the info of every MSA software
-    bar_plots = {"Memories": an.create_bar_plot(best_memories, "RAM Memory Value (KB)", "RAM Usage"),
-                    "Times": an.create_bar_plot(best_times, "Time of Execution (s)", "Execution Times"),
-                    "SP-Scores": an.create_bar_plot(best_sp_scores, "SP-Score", "SP-Scores"),
-                    "CPU": an.create_bar_plot(best_cpus, "Total CPU Usage (%)", "CPU Usage"),
-                    "Overall": an.create_bar_plot(o_scores, "Overall Score", "Overall Scores")}
+    with tracer.span("plot"):
+        bar_plots = {"Memories": an.create_bar_plot(best_memories, "RAM Memory Value (KB)", "RAM Usage"),
+                        "Times": an.create_bar_plot(best_times, "Time of Execution (s)", "Execution Times"),
+                        "SP-Scores": an.create_bar_plot(best_sp_scores, "SP-Score", "SP-Scores", best_sp_errors if args.estimate else None),
+                        "CPU": an.create_bar_plot(best_cpus, "Total CPU Usage (%)", "CPU Usage"),
+                        "Overall": an.create_bar_plot(o_scores, "Overall Score", "Overall Scores")}
+        if engine.reference is not None:
+            bar_plots["TC"] = an.create_bar_plot(best_quality["TC Score"], "TC Score", "TC Scores")
+            bar_plots["SP Agreement"] = an.create_bar_plot(best_quality["SP Agreement"], "SP Agreement", "SP Agreements")
     
     # Obtain the best MSA software for each parameter
     # Get the MSA software(s) with the least memory used
@@ -217,7 +268,7 @@ if __name__ == "__main__":
     overall_str = ", ".join(overall)
 
     # Create a new folder to add all files generated by the MSA softwares
-    filename = os.path.basename(args.dataset).split(".")[0]
+    filename = os.path.basename(compression.strip_extensions(args.dataset))
     folder_name = f"MSA_Info_{filename}"
     # Make sure it creates a unique folder and doesnt overwrite the existing one
     new_folder = uniquify(folder_name)
@@ -226,8 +277,18 @@ if __name__ == "__main__":
         
     # Move all bar plot files to the folder
     for file in bar_plots.values():
+        if file and os.path.exists(file):
+            shutil.move(file, os.path.join(new_folder, os.path.basename(file)))
+    
+    # Move the kept alignments to the folder, compressing the ones written by the MSA softwares themselves
+    for file in kept_files:
         if os.path.exists(file):
+            if codec and compression.detect(file) is None:
+                file = compression.compress_file(file, codec, args.compress_level)
             shutil.move(file, os.path.join(new_folder, os.path.basename(file)))
+
+    # Remove the decompressed dataset
+    scratch.cleanup()
     
     # Create a text file containing the results of the process
     with open(f"MSA_Info_{filename}.log", "w") as file:
@@ -236,12 +297,20 @@ if __name__ == "__main__":
         file.write(f"MSA Software with the least CPU usage: {cpu_str}\n\n")
         file.write(f"MSA Software(s) with the best alignments: {sp_str}\n\n")
         file.write(f"MSA Software(s) with the best overall score: {overall_str}\n\n\n")
-        file.write(an.create_table(best_sp_scores, best_memories, best_times, best_cpus, o_scores, all_memories))
+        if args.estimate:
+            file.write(f"SP-Scores were estimated from a random sample of pairs of sequences (±: {args.confidence:.0%} confidence interval).\n\n")
+        file.write(an.create_table(best_sp_scores, best_memories, best_times, best_cpus, o_scores, all_memories, best_sp_errors if args.estimate else None, best_quality))
     # Move the results file to the "MSA_Info" folder
     file_path = os.path.join(new_folder, f"MSA_Info_{filename}.log")
     if os.path.exists(f"MSA_Info_{filename}.log"):
         shutil.move(f"MSA_Info_{filename}.log", file_path)
     
+    # Save the trace of every stage and a summary of the time spent on each one
+    if tracer.enabled:
+        tracer.export_chrome_trace(os.path.join(new_folder, "Trace.json"))
+        with open(os.path.join(new_folder, "Stage_Times.log"), "w") as file:
+            file.write(tracer.summary_table())
+
     # Display log results as output
     with open(file_path, "r") as file:
         print(file.read())
\ No newline at end of file
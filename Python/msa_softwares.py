@@ -1,31 +1,61 @@
 import time
 import os
 import subprocess
+import threading
 import psutil
+import compression
+import fasta_stream
 
 class msa_softwares:
-    def __init__(self):
-        pass
+    def __init__(self, codec=None, level=None):
+        """
+        Summary:
+            Initializes the MSA softwares runner.
+
+        Parameters:
+            codec: Compression codec of the alignments kept while streaming (default: None, uncompressed).
+            level: Compression level, or None for the default level of the codec (default: None).
+        """
+        self.codec = codec
+        self.level = level
 
-    def track_usage(self, command):
+    def track_usage(self, command, consumer=None):
         """
         Summary:
             This function tracks the execution time, peak memory usage, and peak CPU usage of the alignment run by a command line.
         
         Parameters:
             command: Input command line that will be executed.
+            consumer: Function that reads the standard output of the process from a pipe, in a separate thread (default: None, output is discarded).
+                      It should only collect the raw bytes, since the process waits whenever the pipe is full.
         
         Returns:
             peak_memory: Peak memory usage (in KB) during the process run.
             exec_time: Total execution time (in seconds) of the process.
             peak_cpu_usage: Peak CPU usage (as a percentage) during the process.
+            result: Value returned by the consumer (only when a consumer is given).
         """
         # Get the starting time and baseline CPU usage
         start_time = time.time()
         baseline_cpu = psutil.cpu_percent(interval=None)
 
         # Start the process
-        process = subprocess.Popen(command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE if consumer else subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        # Empty the output pipe while the process runs, so it never blocks on a full pipe
+        if consumer:
+            result = {}
+
+            def read_pipe():
+                try:
+                    result["value"] = consumer(process.stdout)
+                except Exception as e:
+                    result["error"] = e
+                finally:
+                    process.stdout.close()
+
+            reader = threading.Thread(target=read_pipe)
+            reader.start()
 
         # Initialize tracking variables
         peak_memory = 0
@@ -45,32 +75,79 @@ class msa_softwares:
             peak_cpu_usage = max(peak_cpu_usage, cpu_usage)
 
         # Ensure that the process has finished
-        process.communicate()
+        if consumer:
+            process.wait()
+        else:
+            process.communicate()
 
         # Calculate the total execution time
         exec_time = time.time() - start_time
 
+        # Whatever the consumer does after the process ended is not part of its execution time
+        if consumer:
+            reader.join()
+            if "error" in result:
+                raise result["error"]
+            return peak_memory, exec_time, peak_cpu_usage, result["value"]
+
         # Return the tracked metrics
         return peak_memory, exec_time, peak_cpu_usage
+
+    def stream_alignment(self, command, aligned_file, keep=False):
+        """
+        Summary:
+            Runs an MSA software that writes the alignment to its standard output and reads it straight from the pipe.
+            The pipe is only drained while the software runs; the alignment is parsed later, when it is scored,
+            so parsing is never counted in the execution time, memory or CPU usage of the software.
+        
+        Parameters:
+            command: Input command line that will be executed.
+            aligned_file: Path where the alignment is written if it is kept.
+            keep: Whether a copy of the alignment should be written to aligned_file, compressed with the codec of the runner (default: False).
+        
+        Returns:
+            alignment: streamed_alignment object with the output of the software.
+            memory_used: Memory used during the execution of the software.
+            exec_time: Time taken for the execution of the software.
+            cpu_used: CPU usage during the execution of the software.
+        """
+        memory_used, exec_time, cpu_used, chunks = self.track_usage(command, fasta_stream.drain)
+
+        # If no sequences were written to the pipe, every parameter will return a 'None' value that will be parsed in the future
+        alignment = fasta_stream.streamed_alignment(chunks, None)
+        if alignment.is_empty():
+            return None, "N/A", "N/A", "N/A"
+
+        # Write a copy of the alignment only when it should be kept
+        if keep:
+            alignment.path = fasta_stream.write_copy(chunks, compression.output_path(aligned_file, self.codec), self.codec, self.level)
+
+        return alignment, memory_used, exec_time, cpu_used
     
-    def mafft(self, input_file):
+    def mafft(self, input_file, stream=False, keep=False):
         """
         Runs the MAFFT alignment command on the input file and returns the aligned file along with memory and execution time.
         
         Parameters:
             input_file: Input FASTA file that contains the sequences to be aligned.
+            stream: Whether MAFFT should write the alignment to a pipe that is parsed directly, instead of a file (default: False).
+            keep: Whether the alignment should be kept on disk when streaming (default: False).
         
         Returns:
-            aligned_file: Path to the file aligned by the command line.
+            aligned_file: Path to the file aligned by the command line (streamed_alignment object when streaming).
             memory_used: Memory used during the execution of MAFFT.
             exec_time: Time taken for the execution of MAFFT.
         """
         # Get the first name of the file based on the input file name
-        filename = os.path.abspath(input_file).split(".")[0]
+        filename = compression.strip_extensions(os.path.abspath(input_file))
 
         # Get the path which the output file will be written
         aligned_file = f"{filename}_mafft_aln.fasta"
 
+        # Parse the alignment straight from the standard output of MAFFT
+        if stream:
+            return self.stream_alignment(f"mafft {os.path.abspath(input_file)}", aligned_file, keep)
+
         # Define the command line to run the software MAFFT
         command = f"mafft {os.path.abspath(input_file)} > {aligned_file}"
         
@@ -84,24 +161,30 @@ class msa_softwares:
 
         return aligned_file, memory_used, exec_time, cpu_used
     
-    def muscle(self, input_file):
+    def muscle(self, input_file, stream=False, keep=False):
         """
         Runs the MUSCLE alignment command on the input file and returns the aligned file along with memory and execution time.
         
         Parameters:
             input_file: Input FASTA file that contains the sequences to be aligned.
+            stream: Whether MUSCLE should write the alignment to a pipe that is parsed directly, instead of a file (default: False).
+            keep: Whether the alignment should be kept on disk when streaming (default: False).
         
         Returns:
-            aligned_file: Path to the file aligned by the command line.
+            aligned_file: Path to the file aligned by the command line (streamed_alignment object when streaming).
             memory_used: Memory used during the execution of MUSCLE
             exec_time: Time taken for the execution of MUSCLE.
         """
         # Get the first name of the file based on the input file name
-        filename = os.path.abspath(input_file).split(".")[0]
+        filename = compression.strip_extensions(os.path.abspath(input_file))
 
         # Get the path which the output file will be written
         aligned_file = f"{filename}_muscle_aln.fasta"
 
+        # Parse the alignment straight from the standard output of MUSCLE
+        if stream:
+            return self.stream_alignment(f"muscle -align {os.path.abspath(input_file)} -output /dev/stdout", aligned_file, keep)
+
         # Define the command line to run the software MUSCLE
         command = f"muscle -align {os.path.abspath(input_file)} -output {aligned_file}"
         
@@ -115,24 +198,30 @@ class msa_softwares:
 
         return aligned_file, memory_used, exec_time, cpu_used
     
-    def kalign2(self, input_file):
+    def kalign2(self, input_file, stream=False, keep=False):
         """
         Runs the KAlign2 alignment command on the input file and returns the aligned file along with memory and execution time.
         
         Parameters:
             input_file: Input FASTA file that contains the sequences to be aligned.
+            stream: Whether KAlign2 should write the alignment to a pipe that is parsed directly, instead of a file (default: False).
+            keep: Whether the alignment should be kept on disk when streaming (default: False).
         
         Returns:
-            aligned_file: Path to the file aligned by the command line.
+            aligned_file: Path to the file aligned by the command line (streamed_alignment object when streaming).
             memory_used: Memory used during the execution of KAlign2.
             exec_time: Time taken for the execution of KAlign2.
         """
         # Get the first name of the file based on the input file name
-        filename = os.path.abspath(input_file).split(".")[0]
+        filename = compression.strip_extensions(os.path.abspath(input_file))
 
         # Get the path which the output file will be written
         aligned_file = f"{filename}_kalign2_aln.fasta"
 
+        # Parse the alignment straight from the standard output of KAlign2
+        if stream:
+            return self.stream_alignment(f"kalign -i {os.path.abspath(input_file)} -f 0", aligned_file, keep)
+
         # Define the command line to run the software KALIGN2
         command = f"kalign -i {os.path.abspath(input_file)} -o {aligned_file} -f 0"
 
@@ -147,24 +236,30 @@ class msa_softwares:
 
         return aligned_file, memory_used, exec_time, cpu_used
 
-    def clustalo(self, input_file):
+    def clustalo(self, input_file, stream=False, keep=False):
         """
         Runs the ClustalOmega alignment command on the input file and returns the aligned file along with memory and execution time.
         
         Parameters:
             input_file: Input FASTA file that contains the sequences to be aligned.
+            stream: Whether ClustalOmega should write the alignment to a pipe that is parsed directly, instead of a file (default: False).
+            keep: Whether the alignment should be kept on disk when streaming (default: False).
         
         Returns:
-            aligned_file: Path to the file aligned by the command line.
+            aligned_file: Path to the file aligned by the command line (streamed_alignment object when streaming).
             memory_used: Memory used during the execution of ClustalOmega.
             exec_time: Time taken for the execution of ClustalOmega.
         """
         # Get the first name of the file based on the input file name
-        filename = os.path.abspath(input_file).split(".")[0]
+        filename = compression.strip_extensions(os.path.abspath(input_file))
 
         # Get the path which the output file will be written
         aligned_file = f"{filename}_clustalo_aln.fasta"
 
+        # Parse the alignment straight from the standard output of ClustalOmega
+        if stream:
+            return self.stream_alignment(f"clustalo -i {os.path.abspath(input_file)} --outfmt fasta", aligned_file, keep)
+
         # Define the command line to run the software ClustalOmega
         command = f"clustalo -i {os.path.abspath(input_file)} -o {aligned_file} --outfmt fasta"
                 
@@ -178,24 +273,30 @@ class msa_softwares:
 
         return aligned_file, memory_used, exec_time, cpu_used
     
-    def tcoffee(self, input_file):
+    def tcoffee(self, input_file, stream=False, keep=False):
         """
         Runs the T-COFFEE alignment command on the input file and returns the aligned file along with memory and execution time.
         
         Parameters:
             input_file: Input FASTA file that contains the sequences to be aligned.
+            stream: Whether T-COFFEE should write the alignment to a pipe that is parsed directly, instead of a file (default: False).
+            keep: Whether the alignment should be kept on disk when streaming (default: False).
         
         Returns:
-            aligned_file: Path to the file aligned by the command line.
+            aligned_file: Path to the file aligned by the command line (streamed_alignment object when streaming).
             memory_used: Memory used during the execution of T-COFFEE.
             exec_time: Time taken for the execution of T-COFFEE.
         """
         # Get the first name of the file based on the input file name
-        filename = os.path.abspath(input_file).split(".")[0]
+        filename = compression.strip_extensions(os.path.abspath(input_file))
 
         # Get the path which the output file will be written
         aligned_file = f"{filename}_tcoffee_aln.fasta"
 
+        # Parse the alignment straight from the standard output of T-COFFEE
+        if stream:
+            return self.stream_alignment(f"t_coffee {os.path.abspath(input_file)} -outfile stdout -output fasta_aln", aligned_file, keep)
+
         # Define the command line to run the software T-COFFEE
         command = f"t_coffee {os.path.abspath(input_file)} -outfile {aligned_file} -output fasta_aln"
                 
@@ -209,12 +310,14 @@ class msa_softwares:
 
         return aligned_file, memory_used, exec_time, cpu_used
     
-    def prank(self, input_file):
+    def prank(self, input_file, stream=False, keep=False):
         """
         Runs the PRANK alignment command on the input file and returns the aligned file along with memory and execution time.
         
         Parameters:
             input_file: Input FASTA file that contains the sequences to be aligned.
+            stream: Ignored, PRANK can only write the alignment to a file.
+            keep: Ignored, the alignment file is always written.
         
         Returns:
             aligned_file: Path to the file aligned by the command line.
@@ -222,7 +325,7 @@ class msa_softwares:
             exec_time: Time taken for the execution of PRANK.
         """
         # Get the first name of the file based on the input file name
-        filename = os.path.abspath(input_file).split(".")[0]
+        filename = compression.strip_extensions(os.path.abspath(input_file))
         
         # Get the path which the output file will be written
         aligned_file = f"{filename}_prank_aln.best.fas"
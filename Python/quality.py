@@ -0,0 +1,132 @@
+import numpy as np
+import sp_kernel
+
+class quality:
+    def __init__(self, reference=None):
+        """
+        Summary:
+            Initializes the quality engine, encoding the reference alignment (ex.: from BAliBASE) once, if there is one.
+
+        Parameters:
+            reference: Tuple (names, rows) with the identifiers and aligned sequences of the reference alignment (default: None).
+        """
+        self.reference = None
+        if reference is not None:
+            names, rows = reference
+            encoded = sp_kernel.encode_rows(rows)
+            self.reference = (list(names), encoded, encoded == sp_kernel.GAP)
+
+    def metric_names(self):
+        """
+        Summary:
+            Gets the names of the metrics returned by evaluate.
+
+        Returns:
+            names: List with the name of every metric.
+        """
+        names = ["Gap Fraction", "Gap-Free Columns", "Conserved Columns"]
+        if self.reference is not None:
+            names += ["TC Score", "SP Agreement"]
+        return names
+
+    def evaluate(self, names, rows, label="The alignment"):
+        """
+        Summary:
+            Calculates every quality metric of an alignment from a single encoded column matrix:
+            - Gap Fraction: fraction of the cells of the alignment that are gaps.
+            - Gap-Free Columns: fraction of the columns without any gap.
+            - Conserved Columns: fraction of the columns where every sequence has the same residue.
+            - TC Score: fraction of the reference columns (with at least two residues) that are reproduced exactly.
+            - SP Agreement: fraction of the pairs of residues aligned in the reference that are also aligned in this alignment.
+            The last two are only calculated when there is a reference alignment, and are None (with a warning)
+            when the alignment does not contain the same sequences as the reference.
+
+        Parameters:
+            names: List containing the identifier of every aligned sequence.
+            rows: List containing every aligned sequence as an upper case string, or matrix of byte codes (ex.: from a streamed alignment).
+            label: Name of the alignment shown in the warnings (ex.: the MSA software) (default: "The alignment").
+
+        Returns:
+            metrics: Dictionary with the name and value of every metric.
+        """
+        encoded = sp_kernel.encode_rows(rows)
+        gaps = encoded == sp_kernel.GAP
+        num_columns = encoded.shape[1]
+
+        # Column statistics, all taken from the same gap mask
+        gaps_per_column = gaps.sum(axis=0)
+        conserved = (gaps_per_column == 0) & (encoded == encoded[:1]).all(axis=0) if num_columns else np.zeros(0, dtype=bool)
+
+        metrics = {
+            "Gap Fraction": float(gaps.mean()) if gaps.size else 0.0,
+            "Gap-Free Columns": float((gaps_per_column == 0).mean()) if num_columns else 0.0,
+            "Conserved Columns": float(conserved.mean()) if num_columns else 0.0
+        }
+
+        if self.reference is not None:
+            # A mismatch only invalidates the comparison with the reference, so the MSA software keeps every other result
+            try:
+                metrics.update(self.compare(names, encoded, gaps))
+            except ValueError as error:
+                print(f"Warning: {label} could not be compared with the reference alignment ({error}), so its TC Score and SP Agreement are N/A.")
+                metrics.update({"TC Score": None, "SP Agreement": None})
+
+        return metrics
+
+    def compare(self, names, encoded, gaps):
+        """
+        Summary:
+            Compares an encoded alignment with the reference alignment, BAliBASE style.
+            Every residue is located in both alignments at once, so both scores come from the same (reference column, column) pairs.
+
+        Parameters:
+            names: List containing the identifier of every aligned sequence.
+            encoded: Matrix of byte codes of the alignment.
+            gaps: Boolean matrix with the gaps of the alignment.
+
+        Returns:
+            metrics: Dictionary with the TC Score and the SP Agreement (None if the reference has no column with two residues).
+
+        Raises:
+            ValueError: If the alignment and the reference do not contain the same sequences.
+        """
+        ref_names, ref_encoded, ref_gaps = self.reference
+
+        # Put the sequences in the same order as in the reference
+        index = {name: i for i, name in enumerate(names)}
+        if len(index) != len(names) or len(names) != len(ref_names) or set(ref_names) != set(index):
+            raise ValueError("The reference alignment must contain the same sequences (with unique identifiers) as the alignment")
+        order = [index[name] for name in ref_names]
+        encoded = encoded[order]
+        gaps = gaps[order]
+
+        # The residues of both alignments, read row by row, must be the same
+        if not np.array_equal(encoded[~gaps], ref_encoded[~ref_gaps]) or not np.array_equal((~gaps).sum(axis=1), (~ref_gaps).sum(axis=1)):
+            raise ValueError("The sequences of the reference alignment differ from the aligned sequences")
+
+        # Column of every residue in the reference and in the alignment (same residue order in both)
+        ref_columns = np.nonzero(~ref_gaps)[1].astype(np.int64)
+        columns = np.nonzero(~gaps)[1].astype(np.int64)
+
+        # Count the residues of every reference column that fall in each column of the alignment
+        num_columns = max(encoded.shape[1], 1)
+        keys, counts = np.unique(ref_columns * num_columns + columns, return_counts=True)
+        key_ref_columns = keys // num_columns
+        key_columns = keys % num_columns
+
+        # SP Agreement: pairs of residues of a reference column that are still together
+        ref_residues = (~ref_gaps).sum(axis=0)
+        ref_pairs = int((ref_residues * (ref_residues - 1) // 2).sum())
+        agreed_pairs = int((counts * (counts - 1) // 2).sum())
+
+        # TC Score: all residues of the reference column are in one column, which has no other residue
+        residues = (~gaps).sum(axis=0)
+        exact = (counts == ref_residues[key_ref_columns]) & (residues[key_columns] == counts)
+        correct = np.zeros(ref_encoded.shape[1], dtype=bool)
+        correct[key_ref_columns[exact]] = True
+        core = ref_residues >= 2
+
+        return {
+            "TC Score": float(correct[core].mean()) if core.any() else None,
+            "SP Agreement": agreed_pairs / ref_pairs if ref_pairs else None
+        }
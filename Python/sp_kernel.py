@@ -0,0 +1,136 @@
+import numpy as np
+
+# Numba is optional: without it the kernels below still run as plain Python, but SPScore keeps its own reference loop instead
+try:
+    from numba import njit, prange
+    available = True
+except ImportError:
+    available = False
+
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+    prange = range
+
+# Byte code of the gap character
+GAP = ord("-")
+
+def encode_rows(rows):
+    """
+    Summary:
+        Encodes a list of aligned sequences into a matrix of byte codes, one row per sequence.
+
+    Parameters:
+        rows: List containing every aligned sequence as a string (all with the same length), or a matrix that is already encoded
+              (ex.: parsed by fasta_stream), which is returned as it is.
+
+    Returns:
+        encoded: 2D numpy array (uint8) with shape (number of sequences, alignment length).
+    """
+    if isinstance(rows, np.ndarray):
+        return np.ascontiguousarray(rows, dtype=np.uint8)
+    if not rows:
+        return np.zeros((0, 0), dtype=np.uint8)
+    # Characters outside ASCII become '?', which has no score in any matrix (same as the dictionary lookup)
+    data = "".join(rows).encode("ascii", "replace")
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(rows), len(rows[0]))
+
+def decode_rows(rows):
+    """
+    Summary:
+        Turns a matrix of byte codes back into a list of aligned sequences (only needed by the pure Python implementation).
+
+    Parameters:
+        rows: Matrix of byte codes, or a list of strings, which is returned as it is.
+
+    Returns:
+        rows: List containing every aligned sequence as a string.
+    """
+    if isinstance(rows, np.ndarray):
+        return [row.tobytes().decode("ascii") for row in rows]
+    return rows
+
+@njit(cache=True, nogil=True)
+def _pairwise(seq1, seq2, matrix, gap_open, gap_ext):
+    """
+    Summary:
+        Same affine gap state machine as SPScore.pairwise_score, on byte codes and a dense matrix.
+    """
+    score = 0
+    gap1 = 0
+    gap2 = 0
+    for k in range(seq1.shape[0]):
+        a = seq1[k]
+        b = seq2[k]
+        if a == GAP:
+            # Columns where both sequences have gaps are skipped and do not close any gap
+            if b == GAP:
+                continue
+            gap1 += 1
+            if gap2 > 0:
+                score += gap_open + gap2 * gap_ext
+                gap2 = 0
+        elif b == GAP:
+            gap2 += 1
+            if gap1 > 0:
+                score += gap_open + gap1 * gap_ext
+                gap1 = 0
+        else:
+            if gap1 > 0:
+                score += gap_open + gap1 * gap_ext
+                gap1 = 0
+            if gap2 > 0:
+                score += gap_open + gap2 * gap_ext
+                gap2 = 0
+            score += matrix[a, b]
+    # Gaps still open at the end of the alignment are not penalized
+    return score
+
+@njit(cache=True, nogil=True, parallel=True)
+def pair_scores(encoded, left, right, matrix, gap_open, gap_ext):
+    """
+    Summary:
+        Calculates the pairwise score of many pairs of encoded sequences in one call.
+
+    Parameters:
+        encoded: Matrix of byte codes returned by encode_rows.
+        left: Array with the index of the first sequence of every pair.
+        right: Array with the index of the second sequence of every pair.
+        matrix: Dense 256x256 integer scoring matrix indexed by byte code.
+        gap_open: Gap opening penalty.
+        gap_ext: Gap extension penalty per unit length.
+
+    Returns:
+        scores: Array (int64) with the score of every pair.
+    """
+    scores = np.zeros(left.shape[0], dtype=np.int64)
+    for p in prange(left.shape[0]):
+        scores[p] = _pairwise(encoded[left[p]], encoded[right[p]], matrix, gap_open, gap_ext)
+    return scores
+
+@njit(cache=True, nogil=True, parallel=True)
+def sp_score(encoded, counts, matrix, gap_open, gap_ext):
+    """
+    Summary:
+        Calculates the SP-Score of an encoded alignment of unique sequences, where every sequence stands for counts[i] identical copies.
+
+    Parameters:
+        encoded: Matrix of byte codes returned by encode_rows.
+        counts: Array with the number of copies of every sequence.
+        matrix: Dense 256x256 integer scoring matrix indexed by byte code.
+        gap_open: Gap opening penalty.
+        gap_ext: Gap extension penalty per unit length.
+
+    Returns:
+        total: SP-Score of the full alignment (with every copy).
+    """
+    num_seqs = encoded.shape[0]
+    total = 0
+    for i in prange(num_seqs):
+        # Pairs made of two copies of the same sequence
+        if counts[i] > 1:
+            total += counts[i] * (counts[i] - 1) // 2 * _pairwise(encoded[i], encoded[i], matrix, gap_open, gap_ext)
+        # Every copy of sequence i is paired with every copy of sequence j
+        for j in range(i + 1, num_seqs):
+            total += counts[i] * counts[j] * _pairwise(encoded[i], encoded[j], matrix, gap_open, gap_ext)
+    return total
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+class _null_span:
+    """
+    Summary:
+        Context manager that does nothing, returned by a disabled tracer so that instrumented code pays only one attribute check.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_SPAN = _null_span()
+
+def _cpu_time():
+    """
+    Summary:
+        Returns the CPU time (in seconds) used so far by this process and by its finished child processes, so the aligners are accounted as well.
+    """
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+class _span:
+    """
+    Summary:
+        Context manager that records the wall and CPU time of one stage and hands the finished event to its tracer.
+    """
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        # Inherit the arguments (tool, replicate, ...) of the enclosing span so nested stages keep their context
+        stack = self.tracer._stack()
+        if stack:
+            self.args = {**stack[-1].args, **self.args}
+        stack.append(self)
+
+        self.start_wall = time.perf_counter()
+        self.start_cpu = _cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_cpu = _cpu_time()
+        end_wall = time.perf_counter()
+        self.tracer._stack().pop()
+
+        self.tracer._record(self.name, self.args, self.start_wall, end_wall - self.start_wall, self.start_cpu, end_cpu - self.start_cpu)
+        return False
+
+class tracing:
+    def __init__(self, enabled=False):
+        """
+        Summary:
+            Initializes a span-based tracer. When disabled, every span is a shared no-op object.
+
+        Parameters:
+            enabled: Whether the spans should be recorded (default: False).
+        """
+        self.enabled = enabled
+        self.events = []
+        self.origin = time.perf_counter()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def span(self, name, **args):
+        """
+        Summary:
+            Opens a span around a pipeline stage.
+
+        Parameters:
+            name: Name of the stage (ex.: "align", "parse", "sp_score").
+            args: Extra context attached to the span (ex.: tool="MAFFT", replicate=1). Nested spans inherit it.
+
+        Returns:
+            span: Context manager timing the enclosed block.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _span(self, name, args)
+
+    def _stack(self):
+        """
+        Summary:
+            Returns the stack of open spans of the current thread.
+        """
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _record(self, name, args, start_wall, wall, start_cpu, cpu):
+        """
+        Summary:
+            Stores a finished span as a Chrome trace "complete" event (timestamps in microseconds).
+        """
+        event = {
+            "name": name,
+            "cat": args.get("tool", "pipeline"),
+            "ph": "X",
+            "ts": (start_wall - self.origin) * 1e6,
+            "dur": wall * 1e6,
+            "tts": start_cpu * 1e6,
+            "tdur": cpu * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def export_chrome_trace(self, path):
+        """
+        Summary:
+            Writes the recorded spans in the Chrome trace-event JSON format (loadable in chrome://tracing or Perfetto).
+
+        Parameters:
+            path: Path of the JSON file to be written.
+
+        Returns:
+            path: Path of the written file.
+        """
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
+        return path
+
+    def summary_table(self):
+        """
+        Summary:
+            Creates a table with the total wall and CPU time spent in every stage, per MSA software.
+
+        Returns:
+            table: The table object without the indexes.
+        """
+        if not self.events:
+            return "No stages were traced.\n"
+
+        # Convert the events into a dataframe with one row per span
+        df = pd.DataFrame({
+            "Stage": [e["name"] for e in self.events],
+            "MSA Software": [e["args"].get("tool", "-") for e in self.events],
+            "Calls": [1 for _ in self.events],
+            "Wall Time (s)": [e["dur"] / 1e6 for e in self.events],
+            "CPU Time (s)": [e["tdur"] / 1e6 for e in self.events]})
+
+        # Sum every stage of every MSA software over all the replicates
+        df = df.groupby(["Stage", "MSA Software"], sort=False, as_index=False).sum()
+
+        return df.to_string(index=False, float_format=lambda x: f"{x:.4f}") + "\n"
@@ -0,0 +1,129 @@
+import glob
+import os
+import stat
+import sys
+import numpy as np
+import pytest
+
+# The modules of the pipeline are plain scripts inside the Python folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Python"))
+
+import compiled_matrix
+from compiled_matrix import MatrixParseError
+
+MATRICES = sorted(path for path in glob.glob(os.path.join(ROOT, "scoring_matrices", "*")) if os.path.isfile(path))
+
+SMALL_MATRIX = "   A  C  X\nA  2 -1  0\nC -1  3 -2\nX  0 -2 -1\n"
+
+def baseline_dict(path):
+    """
+    Summary:
+        Reads a matrix file the way SPScore did before the matrices were compiled (header on the first line, upper case row symbols).
+    """
+    with open(path) as file:
+        rows = (line.rstrip().split() for line in file)
+        header = next(rows)
+        return {(row[0].upper(), col_id): int(cell) for row in rows if row for col_id, cell in zip(header, row[1:])}
+
+def parse(text):
+    return dict(compiled_matrix.read_scoring_matrix(text.splitlines(keepends=True), "test_matrix"))
+
+@pytest.mark.parametrize("path", MATRICES, ids=os.path.basename)
+def test_matches_baseline(path):
+    scores = baseline_dict(path)
+    symbols = {symbol for pair in scores for symbol in pair}
+    with open(path) as file:
+        table = compiled_matrix.compile_matrix(compiled_matrix.read_scoring_matrix(file, path))
+
+    # Every pair of upper case characters scores as the dictionary lookup did (aliases only apply to symbols the file does not define)
+    codes = [chr(code) for code in range(33, 127) if not chr(code).islower() and (chr(code) in symbols or chr(code) not in compiled_matrix.ALIASES)]
+    for a in codes:
+        for b in codes:
+            assert table[ord(a), ord(b)] == scores.get((a, b), compiled_matrix.UNKNOWN_SCORE), (a, b)
+
+def test_lower_case_and_aliases():
+    with open(os.path.join(ROOT, "scoring_matrices", "BLOSUM62")) as file:
+        blosum = compiled_matrix.compile_matrix(compiled_matrix.read_scoring_matrix(file))
+    table = compiled_matrix.compile_matrix(parse(SMALL_MATRIX).items())
+
+    assert table[ord("a"), ord("c")] == table[ord("A"), ord("C")] == -1
+    # B, Z and J are missing, so they score as X
+    for symbol in "BZJ":
+        assert table[ord(symbol), ord("A")] == table[ord("X"), ord("A")] == 0
+        assert table[ord(symbol), ord("C")] == -2
+    # A matrix that defines them keeps its own scores
+    assert blosum[ord("B"), ord("D")] == 4
+    # Symbols outside the matrix have the unknown score
+    assert table[ord("W"), ord("A")] == table[ord("-"), ord("A")] == compiled_matrix.UNKNOWN_SCORE
+
+@pytest.mark.parametrize("text, message", [
+    ("   A  C\nA  2 x1\nC -1  3\n", "score 'x1'"),
+    ("   A  C\nA  2\nC -1  3\n", "has 1 scores, expected 2"),
+    ("   A  C\nA  2 -1\nA -1  3\n", "defined twice"),
+    ("", "no header"),
+    ("# only a comment\n   A  C\n", "no scores"),
+    ("   A  CC\nA  2 -1\n", "single character"),
+    ("   A  A\nA  2 -1\n", "repeated symbols"),
+])
+def test_parse_errors(text, message):
+    with pytest.raises(MatrixParseError, match=message):
+        parse(text)
+
+def test_parse_error_location():
+    with pytest.raises(MatrixParseError, match="test_matrix, line 4"):
+        parse("# comment\n   A  C\nA  2 -1\nC -1  ?\n")
+
+@pytest.fixture
+def matrix_file(tmp_path):
+    path = tmp_path / "SMALL"
+    path.write_text(SMALL_MATRIX)
+    return str(path)
+
+def test_cache_reuse_and_invalidation(matrix_file, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    table = compiled_matrix.load_compiled(matrix_file, cache_dir)
+    path = compiled_matrix.cache_path(matrix_file, cache_dir)
+
+    # The cached table is memory-mapped and readable by every user of a shared cache
+    assert isinstance(table, np.memmap) and table[ord("C"), ord("C")] == 3
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert os.listdir(cache_dir) == [os.path.basename(path)]
+
+    # The same file reuses the cache
+    mtime = os.stat(path).st_mtime_ns
+    compiled_matrix.load_compiled(matrix_file, cache_dir)
+    assert os.stat(path).st_mtime_ns == mtime
+
+    # A changed file is compiled again under another name
+    with open(matrix_file, "w") as file:
+        file.write(SMALL_MATRIX.replace("C -1  3", "C -1  5"))
+    assert compiled_matrix.cache_path(matrix_file, cache_dir) != path
+    assert compiled_matrix.load_compiled(matrix_file, cache_dir)[ord("C"), ord("C")] == 5
+
+@pytest.mark.parametrize("content", [b"", b"\x93NUMPY garbage", None])
+def test_corrupt_cache(matrix_file, tmp_path, content):
+    cache_dir = str(tmp_path / "cache")
+    compiled_matrix.load_compiled(matrix_file, cache_dir)
+    path = compiled_matrix.cache_path(matrix_file, cache_dir)
+
+    # Truncated, corrupt or wrongly shaped cached tables are compiled again in memory
+    if content is None:
+        with open(path, "wb") as file:
+            np.save(file, np.zeros((3, 3), dtype=np.int32))
+    else:
+        with open(path, "wb") as file:
+            file.write(content)
+    table = compiled_matrix.load_compiled(matrix_file, cache_dir)
+
+    assert table.shape == (256, 256) and table[ord("C"), ord("C")] == 3
+    assert not table.flags.writeable
+
+def test_unwritable_cache(matrix_file, tmp_path):
+    # A cache folder that cannot be created leaves no temporary file and still returns the table
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    table = compiled_matrix.load_compiled(matrix_file, str(blocker / "cache"))
+
+    assert table[ord("A"), ord("A")] == 2 and not table.flags.writeable
+    assert sorted(os.listdir(tmp_path)) == ["SMALL", "blocker"]
@@ -0,0 +1,66 @@
+import os
+import sys
+import pytest
+
+# The modules of the pipeline are plain scripts inside the Python folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Python"))
+
+import compression
+
+DATA = b">seq1 first\nAC-GT\nAC\n>seq2\nA--GTAC\n" * 50
+
+# Format detected from the first bytes of a file written with every codec (bgzip files are gzip files)
+DETECTED = {"gzip": "gzip", "bgzip": "gzip", "bz2": "bz2", "xz": "xz"}
+
+@pytest.mark.parametrize("path, expected", [
+    ("a.b/x.fasta.gz", "a.b/x"),
+    ("data/x.fasta", "data/x"),
+    ("data/x.FASTA.XZ", "data/x"),
+    ("x.fa.bgz", "x"),
+    ("x.bz2", "x"),
+])
+def test_strip_extensions(path, expected):
+    assert compression.strip_extensions(path) == expected
+
+@pytest.mark.parametrize("codec", list(compression.CODECS))
+def test_round_trip(codec, tmp_path):
+    path = compression.output_path(str(tmp_path / "aln.fasta"), codec)
+    with compression.open_output(path, codec) as out:
+        out.write(DATA)
+
+    assert compression.detect(path) == DETECTED[codec]
+    with compression.open_input(path) as file:
+        assert file.read() == DATA
+    with compression.open_input(path, "rt") as file:
+        assert file.read() == DATA.decode()
+
+def test_plain_files(tmp_path):
+    path = str(tmp_path / "aln.fasta")
+    with compression.open_output(path) as out:
+        out.write(DATA)
+
+    assert compression.detect(path) is None
+    with compression.open_input(path) as file:
+        assert file.read() == DATA
+    # Plain files are given to the MSA softwares as they are
+    assert compression.decompress_to_scratch(path, str(tmp_path / "scratch")) == path
+
+@pytest.mark.parametrize("codec", list(compression.CODECS))
+def test_decompress_to_scratch(codec, tmp_path):
+    path = str(tmp_path / "sample.fasta")
+    with open(path, "wb") as out:
+        out.write(DATA)
+    path = compression.compress_file(path, codec)
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    decompressed = compression.decompress_to_scratch(path, str(scratch))
+    assert decompressed == str(scratch / "sample.fasta")
+    with open(decompressed, "rb") as file:
+        assert file.read() == DATA
+    assert not os.path.exists(str(tmp_path / "sample.fasta"))
+
+def test_unknown_codec(tmp_path):
+    with pytest.raises(ValueError, match="Unknown compression codec"):
+        compression.open_output(str(tmp_path / "aln.fasta.zst"), "zstd")
@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# The modules of the pipeline are plain scripts inside the Python folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Python"))
+
+from SPScore import SPScore
+import fasta_stream
+import sp_kernel
+
+@pytest.fixture(scope="module")
+def sp():
+    return SPScore(os.path.join(ROOT, "scoring_matrices", "BLOSUM62"))
+
+def test_parse_records():
+    data = b"junk before the first record\n>seq1 description\nac-G\nT-\n\n>seq2\r\nAC\r\nGT-a\r\n>\nACGTAC\n"
+    names, encoded = fasta_stream.parse_records(data)
+
+    assert names == ["seq1", "seq2", ""]
+    assert encoded.dtype == np.uint8
+    assert sp_kernel.decode_rows(encoded) == ["AC-GT-", "ACGT-A", "ACGTAC"]
+
+def test_parse_records_unequal_lengths():
+    with pytest.raises(ValueError):
+        fasta_stream.parse_records(b">a\nACGT\n>b\nACG\n")
+
+def test_parse_records_empty():
+    names, encoded = fasta_stream.parse_records(b"")
+    assert names == [] and encoded.shape == (0, 0)
+
+def test_streamed_alignment_matches_file(sp, tmp_path):
+    # Lower case rows split over several lines, as written by most MSA softwares
+    rng = np.random.default_rng(0)
+    rows = ["".join(rng.choice(list("acdefghik--"), size=70)) for _ in range(12)]
+    text = "".join(f">seq{i} description\n{row[:60]}\n{row[60:]}\n" for i, row in enumerate(rows + rows[:2]))
+    aligned_file = tmp_path / "aligned.fasta"
+    aligned_file.write_text(text)
+
+    # The pipe is read in chunks that do not follow the lines
+    data = text.encode()
+    streamed = fasta_stream.streamed_alignment([data[:100], data[100:333], data[333:]], None)
+    names, encoded = sp.read_records(streamed)
+    file_names, file_rows = sp.read_records(str(aligned_file))
+
+    assert names == file_names
+    assert np.array_equal(encoded, sp_kernel.encode_rows(file_rows))
+    assert sp.score_rows(encoded) == sp.score_rows(file_rows)
+    assert SPScore(os.path.join(ROOT, "scoring_matrices", "BLOSUM62"), use_kernel=False).score_rows(encoded) == sp.reference_score_rows(file_rows)
+    assert sp.estimate_rows(encoded, seed=0) == sp.estimate_rows(file_rows, seed=0)
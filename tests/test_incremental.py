@@ -0,0 +1,154 @@
+import os
+import random
+import sys
+import numpy as np
+import pytest
+
+# The modules of the pipeline are plain scripts inside the Python folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Python"))
+
+from SPScore import SPScore
+from incremental import incremental
+import sp_kernel
+
+RESIDUES = "ACDEFGHIKLMNPQRSTVWY"
+
+@pytest.fixture(scope="module")
+def inc():
+    return incremental(SPScore(os.path.join(ROOT, "scoring_matrices", "BLOSUM62"), use_kernel=False))
+
+def random_rows(rng, num_seqs, length, gap_rate):
+    """
+    Summary:
+        Creates random aligned sequences, some of them with gaps at the start and at the end and some made only of gaps.
+    """
+    rows = []
+    for _ in range(num_seqs):
+        row = [rng.choice(RESIDUES) if rng.random() > gap_rate else "-" for _ in range(length)]
+        if rng.random() < 0.3:
+            cut = rng.randint(0, length)
+            row[:cut] = "-" * cut
+        if rng.random() < 0.3:
+            cut = rng.randint(0, length)
+            row[length - cut:] = "-" * cut
+        rows.append("".join(row))
+    if rows and rng.random() < 0.2:
+        rows[rng.randrange(len(rows))] = "-" * length
+    return rows
+
+def extend(rng, rows, num_new):
+    """
+    Summary:
+        Re-gaps an alignment by inserting columns (at the start, at the end and in between) where the existing sequences have gaps,
+        and adds new sequences, with residues in any column.
+
+    Returns:
+        rows: The existing sequences, re-gapped.
+        added: The new sequences.
+    """
+    length = len(rows[0]) if rows else rng.randint(0, 6)
+    # Position (in the old alignment) before which every new column is inserted
+    inserted = sorted(rng.randint(0, length) for _ in range(rng.randint(0, 8)))
+    if rng.random() < 0.3:
+        inserted = [0, 0] + inserted + [length]
+
+    def regap(row, fill):
+        out = []
+        for k in range(length + 1):
+            out.extend(fill() for position in inserted if position == k)
+            if k < length:
+                out.append(row[k])
+        return "".join(out)
+
+    new_length = length + len(inserted)
+    regapped = [regap(row, lambda: "-") for row in rows]
+    added = random_rows(rng, num_new, new_length, 0.4)
+    return regapped, added
+
+def sorted_runs(state):
+    order = np.lexsort((state["run_ends"], state["run_starts"]))
+    return state["run_starts"][order].tolist(), state["run_ends"][order].tolist()
+
+def assert_same_state(state, expected):
+    for key in ("sp_score", "names", "scheme", "hashes", "alphabet", "profile", "adjacent"):
+        assert np.array_equal(state[key], expected[key]), key
+    assert sorted_runs(state) == sorted_runs(expected)
+
+@pytest.mark.parametrize("seed", range(40))
+def test_update_matches_reference(inc, seed):
+    rng = random.Random(seed)
+    num_seqs = rng.choice([0, 1, 2, 5, 8])
+    rows = random_rows(rng, num_seqs, rng.randint(1, 25), 0.3)
+    names = [f"s{i}" for i in range(num_seqs)]
+    state = inc.build(names, rows)
+
+    # Several rounds of additions, each one starting from the state of the previous one
+    for round in range(3):
+        rows, added = extend(rng, rows, rng.randint(0, 4))
+        new_names = [f"r{round}_{i}" for i in range(len(added))]
+        all_names, all_rows = names + new_names, rows + added
+        if not all_rows:
+            continue
+
+        # The sequences of the new alignment come in any order
+        order = list(range(len(all_rows)))
+        rng.shuffle(order)
+        state, updated = inc.update(state, [all_names[i] for i in order], [all_rows[i] for i in order])
+
+        assert updated
+        assert state["sp_score"] == inc.sp.reference_score_rows(all_rows)
+        # The extended state is the one made from scratch, with the existing sequences first and the new ones in the order they came
+        assert list(state["names"][:len(names)]) == names
+        by_name = dict(zip(all_names, all_rows))
+        assert_same_state(state, inc.make_state(list(state["names"]), sp_kernel.encode_rows([by_name[name] for name in state["names"]]), state["sp_score"]))
+        names = list(state["names"])
+        rows = [by_name[name] for name in names]
+
+def fallback_cases():
+    rows = ["AC-DE", "A-CDE", "ACD-E"]
+    names = ["a", "b", "c"]
+    return names, rows
+
+@pytest.mark.parametrize("change", ["column", "missing", "duplicate"])
+def test_update_fallback(inc, change):
+    names, rows = fallback_cases()
+    state = inc.build(names, rows)
+
+    if change == "column":
+        # A residue of an existing sequence moved to another column
+        new_names, new_rows = names + ["d"], ["A-CDE", "A-CDE", "ACD-E", "ACDEF"]
+    elif change == "missing":
+        new_names, new_rows = ["a", "c", "d"], ["AC-DE", "ACD-E", "ACDEF"]
+    else:
+        new_names, new_rows = names + ["a"], rows + ["ACDEF"]
+
+    new_state, updated = inc.update(state, new_names, new_rows)
+    assert not updated
+    assert new_state["sp_score"] == inc.sp.reference_score_rows(new_rows)
+
+def test_update_other_matrix(inc):
+    names, rows = fallback_cases()
+    other = incremental(SPScore(os.path.join(ROOT, "scoring_matrices", "BLOSUM80"), use_kernel=False))
+    state = other.build(names, rows)
+
+    new_rows = [row + "-" for row in rows] + ["ACDEF-"]
+    new_state, updated = inc.update(state, names + ["d"], new_rows)
+    assert not updated
+    assert new_state["sp_score"] == inc.sp.reference_score_rows(new_rows)
+
+def test_save_load_state(inc, tmp_path):
+    names, rows = fallback_cases()
+    state = inc.build(names, rows)
+    path = str(tmp_path / "state.npz")
+    inc.save_state(state, path)
+    loaded = inc.load_state(path)
+
+    assert isinstance(loaded["sp_score"], int)
+    assert_same_state(loaded, state)
+
+    # A loaded state is updated like the original one
+    new_names, new_rows = names + ["d"], ["-" + row for row in rows] + ["WACDE-"]
+    updated_state, updated = inc.update(loaded, new_names, new_rows)
+    assert updated
+    assert updated_state["sp_score"] == inc.sp.reference_score_rows(new_rows)
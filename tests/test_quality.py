@@ -0,0 +1,31 @@
+import os
+import sys
+
+# The modules of the pipeline are plain scripts inside the Python folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Python"))
+
+from quality import quality
+
+REFERENCE = (["a", "b", "c"], ["AC-GT", "ACAGT", "-CAGT"])
+
+def test_reference_comparison():
+    engine = quality(REFERENCE)
+    metrics = engine.evaluate(["c", "a", "b"], ["C-AGT", "ACG-T", "ACAGT"])
+
+    # Only the last reference column is reproduced, and 7 of the 11 reference pairs are still aligned
+    assert metrics["TC Score"] == 1 / 5
+    assert metrics["SP Agreement"] == 7 / 11
+
+def test_mismatch_with_reference(capsys):
+    # Another residue in one sequence only invalidates the comparison with the reference
+    engine = quality(REFERENCE)
+    metrics = engine.evaluate(["a", "b", "c"], ["AC-GT", "ACCGT", "-CAGT"], "MAFFT")
+
+    assert metrics["TC Score"] is None and metrics["SP Agreement"] is None
+    assert metrics["Gap Fraction"] == 2 / 15
+    assert "MAFFT" in capsys.readouterr().out
+
+def test_missing_sequence():
+    metrics = quality(REFERENCE).evaluate(["a", "b"], ["AC-GT", "ACAGT"])
+    assert metrics["TC Score"] is None and metrics["SP Agreement"] is None
@@ -0,0 +1,35 @@
+import os
+import random
+import sys
+import pytest
+
+# The modules of the pipeline are plain scripts inside the Python folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Python"))
+
+from SPScore import SPScore
+
+@pytest.fixture(scope="module")
+def sp():
+    return SPScore(os.path.join(ROOT, "scoring_matrices", "NUCLEOTIDE"))
+
+def random_rows(num_seqs, length, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice("ACGT-") for _ in range(length)) for _ in range(num_seqs)]
+
+def test_estimate_coverage(sp):
+    # The 95% confidence interval should contain the exact SP-Score in about 19 of 20 runs
+    rows = random_rows(400, 60)
+    exact = sp.score_rows(rows)
+    covered = 0
+    for seed in range(20):
+        estimate, half_width, sampled = sp.estimate_rows(rows, rel_error=0.05, seed=seed)
+        assert sampled < len(rows) * (len(rows) - 1) // 2
+        covered += abs(estimate - exact) <= half_width
+
+    assert covered >= 16
+
+def test_unreachable_error_falls_back_to_exact(sp):
+    # Without a time budget, a relative error of zero is never reached, so every pair ends up scored exactly
+    rows = random_rows(120, 40)
+    assert sp.estimate_rows(rows, rel_error=0.0, seed=1) == (sp.score_rows(rows), 0.0, len(rows) * (len(rows) - 1) // 2)
@@ -0,0 +1,82 @@
+import glob
+import os
+import random
+import sys
+import numpy as np
+import pytest
+from Bio import SeqIO
+
+# The modules of the pipeline are plain scripts inside the Python folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Python"))
+
+from SPScore import SPScore
+import sp_kernel
+
+# Every bundled dataset with the scoring matrix of its sequence type
+DATASETS = [(path, "NUCLEOTIDE") for path in sorted(glob.glob(os.path.join(ROOT, "datasets", "dna_seqs", "*.fasta")))] + \
+           [(path, "BLOSUM62") for path in sorted(glob.glob(os.path.join(ROOT, "datasets", "protein_seqs", "*.fasta")))]
+
+# Only the first sequences of every dataset are used, since the reference implementation is pure Python
+NUM_SEQS = 20
+
+def gapped_rows(path, seed=0):
+    """
+    Summary:
+        Turns the first sequences of a dataset into an alignment by inserting gaps at random positions,
+        including a few duplicated rows and a column where every sequence has a gap.
+
+    Parameters:
+        path: Path of the FASTA dataset.
+        seed: Seed of the random number generator (default: 0).
+
+    Returns:
+        rows: List containing every aligned sequence as an upper case string.
+    """
+    rng = random.Random(seed)
+    sequences = [str(record.seq).upper() for record in SeqIO.parse(path, "fasta")][:NUM_SEQS]
+    length = max(len(seq) for seq in sequences) + 10
+
+    rows = []
+    for seq in sequences:
+        row = list(seq)
+        for _ in range(length - len(seq)):
+            row.insert(rng.randint(0, len(row)), "-")
+        rows.append("".join(row) + "-")
+
+    # Duplicated rows go through the collapsing of identical sequences
+    return rows + rows[:3] + [rows[0]]
+
+@pytest.fixture(scope="module", params=DATASETS, ids=lambda dataset: os.path.basename(os.path.dirname(dataset[0])) + "/" + os.path.basename(dataset[0]))
+def case(request):
+    path, matrix = request.param
+    matrix_file = os.path.join(ROOT, "scoring_matrices", matrix)
+    sp = SPScore(matrix_file, use_kernel=False)
+    rows = gapped_rows(path)
+    return matrix_file, sp, rows, sp.reference_score_rows(rows)
+
+@pytest.mark.skipif(not sp_kernel.available, reason="Numba is not installed")
+def test_kernel_sp_score(case):
+    _, sp, rows, expected = case
+    unique, counts = sp.collapse_rows(rows)
+    gap_open, gap_ext = sp.gap_parameters()
+
+    assert sp_kernel.sp_score(sp_kernel.encode_rows(unique), np.array(counts, dtype=np.int64), sp.dense_matrix, gap_open, gap_ext) == expected
+
+@pytest.mark.skipif(not sp_kernel.available, reason="Numba is not installed")
+def test_kernel_pair_scores(case):
+    _, sp, rows, _ = case
+    gap_open, gap_ext = sp.gap_parameters()
+    left, right = np.triu_indices(len(rows), 1)
+
+    scores = sp_kernel.pair_scores(sp_kernel.encode_rows(rows), left, right, sp.dense_matrix, gap_open, gap_ext)
+    assert scores.tolist() == [sp.pairwise_score(rows[i], rows[j]) for i, j in zip(left, right)]
+
+@pytest.mark.skipif(not sp_kernel.available, reason="Numba is not installed")
+def test_kernel_score_rows(case):
+    matrix_file, _, rows, expected = case
+    assert SPScore(matrix_file, use_kernel=True).score_rows(rows) == expected
+
+def test_fallback_score_rows(case):
+    _, sp, rows, expected = case
+    assert sp.score_rows(rows) == expected